@@ -0,0 +1,107 @@
+import threading
+import cv2
+import numpy as np
+
+from frame_pipeline import ScratchBuffers
+
+# Modelos de fondo disponibles como alternativa al chroma key verde
+BACKGROUND_METHODS = ("average", "mog2")
+
+BG_SCALE = 4  # El modelo trabaja a 1/BG_SCALE de la resolución de la ROI
+BG_LEARNING_RATE = 0.05  # Peso de cada frame nuevo en la media (~20 frames de memoria)
+BG_LEARN_FRAMES = 10  # Frames de la ROI vacía que se aprenden antes de usar el modelo
+BG_DIFF_THRESHOLD = 30  # Diferencia máxima por canal (0..255) para seguir siendo fondo
+BG_MOG2_HISTORY = 60
+BG_MOG2_VAR_THRESHOLD = 25
+# Varianza mínima por canal: con pocos frames de espera MOG2 subestima el ruido
+# de la cámara y marca como primer plano el contorno de todo lo que se mueve
+BG_MOG2_VAR_MIN = 64
+
+
+class BackgroundModel:
+    """
+    Modelo del fondo de una ROI de jugador, para mesas sin pantalla verde.
+
+    Aprende BG_LEARN_FRAMES frames de la ROI vacía (el motor solo lo entrena
+    después de pedir que se retiren las manos y de que se confirme con ESPACIO)
+    y a partir de ahí queda congelado hasta reset(): apply(roi) solo compara con
+    lo aprendido.
+    Trabaja sobre la ROI reducida y suavizada; la máscara de primer plano se
+    devuelve al tamaño de la ROI. "average" es una media móvil por píxel
+    (accumulateWeighted) y "mog2", el sustractor de mezcla de gaussianas de OpenCV.
+    """
+
+    def __init__(self, method="average", scale=BG_SCALE, learning_rate=BG_LEARNING_RATE):
+        if method not in BACKGROUND_METHODS:
+            raise ValueError(f"modelo de fondo desconocido: {method}")
+        self.method = method
+        self.scale = scale
+        self.learning_rate = learning_rate
+        # Protege el estado del modelo si se consulta o reinicia desde otro hilo
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Olvida el fondo aprendido (p. ej. al volver a entrar en una partida)."""
+        self.learned_frames = 0
+        self._mean = None
+        self._background = None
+        self._mog2 = None
+        if self.method == "mog2":
+            self._mog2 = cv2.createBackgroundSubtractorMOG2(history=BG_MOG2_HISTORY, varThreshold=BG_MOG2_VAR_THRESHOLD,
+                                                            detectShadows=False)
+            self._mog2.setVarMin(BG_MOG2_VAR_MIN)
+            self._mog2.setVarInit(BG_MOG2_VAR_MIN)
+
+    @property
+    def ready(self):
+        return self.learned_frames >= BG_LEARN_FRAMES
+
+    def _small(self, roi, scratch):
+        h, w = roi.shape[:2]
+        size = (max(1, w // self.scale), max(1, h // self.scale))
+        shape = (size[1], size[0], roi.shape[2])
+        # INTER_LINEAR es ~7x más rápido que INTER_AREA; el desenfoque posterior
+        # compensa el aliasing de muestrear sin promediar
+        resized = cv2.resize(roi, size, dst=scratch.get("bg_resized", shape), interpolation=cv2.INTER_LINEAR)
+        return cv2.GaussianBlur(resized, (3, 3), 0, dst=scratch.get("bg_small", shape))
+
+    def apply(self, roi, learn=False, scratch=None):
+        """
+        Máscara de primer plano (0/255) del tamaño de la ROI, o None mientras el
+        modelo no esté listo. Con learn=True el frame se añade antes al modelo,
+        salvo si ya está listo (congelado). Los intermedios y la máscara se
+        escriben en `scratch` (frame_pipeline.ScratchBuffers), que debe ser propio
+        de quien llama.
+        """
+        if roi.size == 0 or (not learn and not self.ready):
+            return None
+        scratch = ScratchBuffers() if scratch is None else scratch
+        small = self._small(roi, scratch)
+        small_fg = scratch.get("bg_small_fg", small.shape[:2])
+        with self._lock:
+            learn = learn and not self.ready
+            if self.method == "mog2":
+                self._mog2.apply(small, small_fg, learningRate=-1 if learn else 0)
+            else:
+                if learn:
+                    if self._mean is None:
+                        self._mean = small.astype(np.float32)
+                        self._background = np.empty_like(small)
+                    else:
+                        cv2.accumulateWeighted(small, self._mean, self.learning_rate)
+                    cv2.convertScaleAbs(self._mean, dst=self._background)
+                diff = cv2.absdiff(small, self._background, dst=scratch.get("bg_diff", small.shape))
+                # Máxima diferencia entre canales (cv2.max en lugar de np.max(axis=2), mucho más lento)
+                channels = [cv2.extractChannel(diff, i, dst=scratch.get(f"bg_diff{i}", small_fg.shape))
+                            for i in range(3)]
+                cv2.max(channels[0], channels[1], dst=small_fg)
+                cv2.max(small_fg, channels[2], dst=small_fg)
+                cv2.threshold(small_fg, BG_DIFF_THRESHOLD, 255, cv2.THRESH_BINARY, dst=small_fg)
+            if learn:
+                self.learned_frames += 1
+            if not self.ready:
+                return None
+
+        return cv2.resize(small_fg, (roi.shape[1], roi.shape[0]), dst=scratch.get("foreground", roi.shape[:2]),
+                          interpolation=cv2.INTER_NEAREST)
@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+
+from profiling import profiler
+from vision import detect_color_ball_pyramid
+
+TRACK_MARGIN = 24  # px alrededor de la bola prevista que se vuelven a segmentar
+TRACK_MAX_WINDOW = 0.6  # Si la ventana supera esta fracción del frame, se busca en todo
+
+
+def _touches_border(contour, window, frame_shape):
+    """True si el contorno toca un borde de la ventana que no es también borde del frame."""
+    x, y, w, h = cv2.boundingRect(contour)
+    x0, y0, x1, y1 = window
+    height, width = frame_shape[:2]
+    return ((x <= x0 and x0 > 0) or (y <= y0 and y0 > 0) or
+            (x + w >= x1 and x1 < width) or (y + h >= y1 and y1 < height))
+
+
+class BallTracker:
+    """
+    Seguimiento de la bola del menú con un filtro de Kalman de velocidad constante.
+
+    Mientras hay seguimiento, cada frame se segmenta solo una ventana alrededor
+    de la posición prevista (tamaño de la última bola + velocidad + margen), a
+    resolución completa. Si la bola no aparece en la ventana se considera
+    perdida y se vuelve a buscar en el frame entero en ese mismo frame, así que
+    una bola que sale de la ventana no se pierde ni un frame.
+    """
+
+    def __init__(self, pyramid_level=2):
+        self.pyramid_level = pyramid_level
+        self.kalman = cv2.KalmanFilter(4, 2)  # Estado (x, y, vx, vy), medida (x, y); unidades: px y frames
+        self.kalman.transitionMatrix = np.array([[1, 0, 1, 0],
+                                                 [0, 1, 0, 1],
+                                                 [0, 0, 1, 0],
+                                                 [0, 0, 0, 1]], np.float32)
+        self.kalman.measurementMatrix = np.array([[1, 0, 0, 0],
+                                                  [0, 1, 0, 0]], np.float32)
+        self.kalman.processNoiseCov = np.eye(4, dtype=np.float32) * 1e-2
+        self.kalman.measurementNoiseCov = np.eye(2, dtype=np.float32) * 1.0
+        self.tracking = False
+        self.size = (0, 0)
+        self.tracked_frames = 0
+        self.full_scans = 0
+
+    def reset(self):
+        self.tracking = False
+
+    def _start(self, center):
+        self.kalman.statePost = np.array([[center[0]], [center[1]], [0], [0]], np.float32)
+        self.kalman.errorCovPost = np.eye(4, dtype=np.float32)
+        self.tracking = True
+
+    def search_window(self, frame_shape):
+        """Ventana (x0, y0, x1, y1) donde se espera la bola, o None si hay que buscar en todo el frame."""
+        if not self.tracking:
+            return None
+        x, y, vx, vy = self.kalman.predict().ravel()
+        height, width = frame_shape[:2]
+        half_w = self.size[0] / 2 + abs(vx) + TRACK_MARGIN
+        half_h = self.size[1] / 2 + abs(vy) + TRACK_MARGIN
+        if 2 * half_w * 2 * half_h > TRACK_MAX_WINDOW * width * height:
+            return None
+        x0, y0 = max(int(x - half_w), 0), max(int(y - half_h), 0)
+        x1, y1 = min(int(x + half_w), width), min(int(y + half_h), height)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return x0, y0, x1, y1
+
+    def _update(self, contour):
+        x, y, w, h = cv2.boundingRect(contour)
+        center = np.array([[x + w / 2], [y + h / 2]], np.float32)
+        self.size = (w, h)
+        if self.tracking:
+            self.kalman.correct(center)
+        else:
+            self._start(center.ravel())
+
+    def detect(self, frame, scratch=None):
+        """
+        detect_color_ball_pyramid limitado a la ventana de seguimiento. Devuelve
+        (color, contorno). `scratch` son los buffers de trabajo de la detección.
+        """
+        window = self.search_window(frame.shape)
+        if window is not None:
+            x0, y0, x1, y1 = window
+            with profiler.span("ball_track"):
+                color, contour = detect_color_ball_pyramid(frame[y0:y1, x0:x1], 0, offset=(x0, y0), scratch=scratch)
+            # Una bola cortada por el borde de la ventana se ha salido de ella
+            if color is not None and not _touches_border(contour, window, frame.shape):
+                self.tracked_frames += 1
+                self._update(contour)
+                return color, contour
+            # Bola perdida: búsqueda completa en este mismo frame
+            self.tracking = False
+
+        self.full_scans += 1
+        color, contour = detect_color_ball_pyramid(frame, self.pyramid_level, scratch=scratch)
+        if color is not None:
+            self._update(contour)
+        return color, contour
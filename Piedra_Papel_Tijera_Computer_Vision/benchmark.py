@@ -0,0 +1,439 @@
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+
+from background_model import BACKGROUND_METHODS
+from engine import GameEngine, MENU_PYRAMID_LEVEL, game_rois, parse_key_schedule
+from frame_source import open_source
+from profiling import profiler
+from vision import SKIN_BACKENDS, classify_gesture, segment_skin
+
+# Sesiones grabadas: vídeos o directorios de imágenes. Cada sesión puede tener al
+# lado un archivo "<nombre>.keys" con las teclas por frame (p. ej. "90:space,120:space")
+# para recorrer también las pantallas de juego.
+SESSIONS_DIR = "benchmark_sessions"
+VIDEO_EXTENSIONS = ('.avi', '.mp4', '.mkv', '.mov')
+
+# Medida de memoria (--alloc): frames iniciales descartados en la pasada medida,
+# frames crudos retenidos (más que los del historial del motor) y límite por frame
+ALLOC_WARMUP_FRAMES = 10
+ALLOC_KEEP_FRAMES = 32
+ALLOC_LIMIT_KB = 64
+
+# Sesión sintética generada en memoria (--synthetic): las bolas roja, amarilla y
+# azul para entrar en PvP y después una mano por jugador sobre el fondo verde,
+# con las teclas que confirman el modo y empiezan la cuenta atrás
+SYNTHETIC_SESSION = "<sintética>"
+SYNTHETIC_SIZE = (640, 480)
+SYNTHETIC_FPS = 30
+SYNTHETIC_BACKGROUND = (60, 180, 60)
+SYNTHETIC_SKIN = (150, 170, 210)
+SYNTHETIC_BALLS = ((40, 40, 220), (30, 220, 240), (220, 90, 30))
+SYNTHETIC_BALL_FRAMES = 30
+SYNTHETIC_GAME_FRAMES = 200
+SYNTHETIC_KEYS = "92:space,100:space"
+
+# Orden en el que se muestran las etapas
+STAGE_ORDER = ["undistort", "flip", "ball_track", "ball_pyramid", "ball_blur", "ball_hsv", "ball_masks", "ball_morphology",
+               "ball_contours", "background", "hsv", "masks", "morphology", "contours", "defects", "gesture_drawing", "detect_color_ball", "detect_color_ball_pyramid", "detect_gesture", "rois",
+               "draw_rounded_rectangle", "draw_text_with_background", "draw_translucent_panel", "draw_static_layer", "draw_text_with_outline",
+               "draw_progress_circle", "drawing", "frame"]
+
+
+def find_sessions(directory):
+    """Vídeos y subdirectorios de imágenes de `directory`, en orden alfabético."""
+    sessions = []
+    for entry in sorted(os.listdir(directory)):
+        path = os.path.join(directory, entry)
+        if os.path.isdir(path) or entry.lower().endswith(VIDEO_EXTENSIONS):
+            sessions.append(path)
+    return sessions
+
+
+def load_keys(session):
+    keys_file = os.path.splitext(session.rstrip(os.sep))[0] + ".keys"
+    if os.path.exists(keys_file):
+        with open(keys_file) as f:
+            return parse_key_schedule(f.read().strip())
+    return {}
+
+
+def run_session(session, render=True, parallel_rois=None, menu_level=MENU_PYRAMID_LEVEL, menu_tracking=True,
+                skin_backend="box", background="chroma"):
+    """Reproduce una sesión a máxima velocidad. Devuelve (frames, segundos)."""
+    source = open_source(session, realtime=False)
+    keys = load_keys(session)
+    engine = GameEngine(render=render, parallel_rois=parallel_rois, menu_pyramid_level=menu_level,
+                        menu_tracking=menu_tracking, skin_backend=skin_backend, background=background)
+
+    frames = 0
+    start = time.perf_counter()
+    while True:
+        ret, frame = source.read()
+        if not ret: break
+        with profiler.span("frame"):
+            engine.step(frame, timestamp=source.last_timestamp, key=keys.get(frames, -1))
+        frames += 1
+    elapsed = time.perf_counter() - start
+    source.release()
+    engine.close()
+    return frames, elapsed
+
+
+def run_all(sessions, render=True, parallel_rois=None, menu_level=MENU_PYRAMID_LEVEL, menu_tracking=True,
+            skin_backend="box", background="chroma"):
+    """Ejecuta todas las sesiones con el perfilador limpio y devuelve el resultado agregado."""
+    profiler.reset()
+    result = {'sessions': {}, 'frames': 0, 'seconds': 0.0}
+    for session in sessions:
+        frames, elapsed = run_session(session, render=render, parallel_rois=parallel_rois,
+                                      menu_level=menu_level, menu_tracking=menu_tracking,
+                                      skin_backend=skin_backend, background=background)
+        result['sessions'][session] = {'frames': frames, 'fps': frames / elapsed if elapsed > 0 else 0.0}
+        result['frames'] += frames
+        result['seconds'] += elapsed
+    result['fps'] = result['frames'] / result['seconds'] if result['seconds'] > 0 else 0.0
+    result['stages'] = summarize(profiler.samples)
+    return result
+
+
+def print_roi_comparison(serial, parallel):
+    """Latencia de clasificar las ROIs de un frame en serie frente a en paralelo."""
+    print(f"\nClasificación de ROIs por frame ({os.cpu_count()} núcleos):")
+    for name, result in (("serie", serial), ("paralelo", parallel)):
+        st = result['stages'].get('rois')
+        if st:
+            print(f"  {name:<10} p50 {st['p50']:.3f} ms  p95 {st['p95']:.3f} ms  |  {result['fps']:.1f} FPS")
+    if 'rois' in serial['stages'] and 'rois' in parallel['stages']:
+        print(f"  mejora p50: x{serial['stages']['rois']['p50'] / parallel['stages']['rois']['p50']:.2f}")
+
+
+def compare_skin_backends(sessions):
+    """
+    Segmenta y clasifica las dos ROIs de juego de cada frame con cada backend de
+    piel. Devuelve, por backend, los ms por ROI de la segmentación y de la
+    clasificación completa, la coincidencia del gesto con la caja HSV y el IoU
+    medio de su máscara con la de la caja.
+
+    Las sesiones no tienen etiquetas, así que no es una medida de acierto: solo
+    dice cuánto se parece cada backend a la caja (que coincide siempre consigo misma).
+    """
+    stats = {backend: {'segment': [], 'classify': [], 'agree': 0, 'iou': []} for backend in SKIN_BACKENDS}
+    rois_total = 0
+    for session in sessions:
+        source = open_source(session, realtime=False)
+        engine = GameEngine(render=False, parallel_rois=False)
+        while True:
+            ret, raw = source.read()
+            if not ret: break
+            frame = engine.preprocess(raw)
+            for x1, y1, x2, y2 in game_rois(frame.shape[1], frame.shape[0]):
+                roi = frame[y1:y2, x1:x2]
+                hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
+                masks, gestures = {}, {}
+                for backend in SKIN_BACKENDS:
+                    start = time.perf_counter()
+                    masks[backend] = segment_skin(hsv, backend)
+                    stats[backend]['segment'].append(time.perf_counter() - start)
+                    start = time.perf_counter()
+                    gestures[backend] = classify_gesture(roi, backend)['gesture']
+                    stats[backend]['classify'].append(time.perf_counter() - start)
+                for backend in SKIN_BACKENDS:
+                    stats[backend]['agree'] += gestures[backend] == gestures["box"]
+                    union = cv2.countNonZero(cv2.bitwise_or(masks[backend], masks["box"]))
+                    inter = cv2.countNonZero(cv2.bitwise_and(masks[backend], masks["box"]))
+                    stats[backend]['iou'].append(inter / union if union else 1.0)
+                rois_total += 1
+        source.release()
+        engine.close()
+
+    return {backend: {
+        'rois': rois_total,
+        'segment_ms': float(np.percentile(st['segment'], 50) * 1000),
+        'classify_ms': float(np.percentile(st['classify'], 50) * 1000),
+        'agreement': st['agree'] / rois_total if rois_total else 0.0,
+        'iou': float(np.mean(st['iou'])) if st['iou'] else 0.0,
+    } for backend, st in stats.items()}
+
+
+def print_skin_comparison(comparison):
+    """Tabla de compare_skin_backends."""
+    rois = next(iter(comparison.values()))['rois']
+    print(f"\nSegmentación de la mano ({rois} ROIs, p50 por ROI; coincidencia con box, no acierto):")
+    print(f"  {'backend':<14}{'máscara':>10}{'gesto':>10}{'coinc. box':>12}{'IoU box':>10}")
+    for backend, st in comparison.items():
+        print(f"  {backend:<14}{st['segment_ms']:>8.3f}ms{st['classify_ms']:>8.3f}ms"
+              f"{st['agreement']:>12.1%}{st['iou']:>10.3f}")
+
+
+def _draw_synthetic_hand(frame, cx, cy, fingers):
+    """Palma, muñeca y `fingers` dedos abiertos en abanico."""
+    cv2.ellipse(frame, (cx, cy), (45, 55), 0, 0, 360, SYNTHETIC_SKIN, -1)
+    cv2.rectangle(frame, (cx - 30, cy), (cx + 30, cy + 150), SYNTHETIC_SKIN, -1)
+    for i in range(fingers):
+        angle = np.deg2rad((-60 + i * 120 / (fingers - 1) if fingers > 1 else 0) - 90)
+        tip = (int(cx + np.cos(angle) * 110), int(cy + np.sin(angle) * 110))
+        cv2.line(frame, (cx, cy), tip, SYNTHETIC_SKIN, 18)
+
+
+def synthetic_frames():
+    """
+    Frames (frame, marca de tiempo, tecla) de la sesión sintética: no depende
+    de sesiones grabadas, así que --alloc --synthetic se puede ejecutar en
+    cualquier copia del repositorio.
+    """
+    width, height = SYNTHETIC_SIZE
+    keys = parse_key_schedule(SYNTHETIC_KEYS)
+    rng = np.random.default_rng(0)
+    index = 0
+    scenes = [(color, None) for color in SYNTHETIC_BALLS for _ in range(SYNTHETIC_BALL_FRAMES)]
+    scenes += [(None, i) for i in range(SYNTHETIC_GAME_FRAMES)]
+    for ball, game_index in scenes:
+        frame = np.empty((height, width, 3), np.uint8)
+        frame[:] = SYNTHETIC_BACKGROUND
+        if ball is not None:
+            # La bola se mueve un píxel por frame (seguimiento del menú)
+            cv2.circle(frame, (width // 2 + index % SYNTHETIC_BALL_FRAMES, height // 2), 60, ball, -1)
+        else:
+            # Espejo: el jugador 1 aparece a la derecha del frame crudo
+            _draw_synthetic_hand(frame, 470, 230, 5 if game_index > 60 else 0)
+            _draw_synthetic_hand(frame, 170, 230, 3 if game_index < 100 else 2)
+        cv2.add(frame, rng.integers(0, 8, frame.shape, dtype=np.uint8), dst=frame)
+        yield frame, index / SYNTHETIC_FPS, keys.get(index, -1)
+        index += 1
+
+
+def session_frames(session):
+    """Frames (frame, marca de tiempo, tecla) de una sesión grabada o de la sintética."""
+    if session == SYNTHETIC_SESSION:
+        yield from synthetic_frames()
+        return
+    keys = load_keys(session)
+    source = open_source(session, realtime=False)
+    try:
+        index = 0
+        while True:
+            ret, frame = source.read()
+            if not ret: break
+            yield frame, source.last_timestamp, keys.get(index, -1)
+            index += 1
+    finally:
+        source.release()
+
+
+def measure_allocations(sessions, render=True, parallel_rois=None, menu_level=MENU_PYRAMID_LEVEL, menu_tracking=True,
+                        skin_backend="box", background="chroma"):
+    """
+    Memoria reservada por engine.step() en cada frame en régimen estacionario,
+    medida con tracemalloc (incluye los arrays de numpy, también los que
+    devuelve OpenCV).
+
+    `sessions` son rutas de sesiones grabadas o SYNTHETIC_SESSION.
+    Cada sesión se reproduce dos veces: la primera solo llena las cachés de la
+    interfaz (capas fijas y textos ya rasterizados) y la segunda, con un motor
+    nuevo, se mide. Por frame se toma el pico por encima de la memoria de antes
+    de step(): con los buffers reutilizados solo quedan contornos y objetos
+    pequeños. Los frames crudos se retienen aquí unos frames más que en el
+    historial del motor; si no, el que sale del historial se libera dentro de
+    step() y compensa en el pico lo reservado.
+    Devuelve, por pantalla, el número de frames y los KB p50/p95/máx.
+    """
+    options = {'render': render, 'parallel_rois': parallel_rois, 'menu_pyramid_level': menu_level,
+               'menu_tracking': menu_tracking, 'skin_backend': skin_backend, 'background': background}
+    samples = collections.defaultdict(list)
+    buffers = 0
+    tracemalloc.start()
+    try:
+        for session in sessions:
+            for measured in (False, True):
+                engine = GameEngine(**options)
+                raw_frames = collections.deque(maxlen=ALLOC_KEEP_FRAMES)
+                for index, (frame, timestamp, key) in enumerate(session_frames(session)):
+                    raw_frames.append(frame)
+                    tracemalloc.reset_peak()
+                    before = tracemalloc.get_traced_memory()[0]
+                    state = engine.step(frame, timestamp=timestamp, key=key)
+                    peak = tracemalloc.get_traced_memory()[1] - before
+                    if measured and index >= ALLOC_WARMUP_FRAMES:
+                        samples[state['screen']].append(peak)
+                buffers = max(buffers, engine.pipeline.nbytes)
+                engine.close()
+    finally:
+        tracemalloc.stop()
+
+    result = {'buffers_kb': buffers / 1024, 'screens': {}}
+    for screen, peaks in samples.items():
+        kb = np.array(peaks) / 1024
+        result['screens'][screen] = {'frames': int(kb.size), 'p50': float(np.percentile(kb, 50)),
+                                     'p95': float(np.percentile(kb, 95)), 'max': float(kb.max())}
+    return result
+
+
+def print_alloc_report(result, limit_kb=ALLOC_LIMIT_KB):
+    """Tabla de measure_allocations. Devuelve las pantallas cuyo p95 supera `limit_kb`."""
+    print(f"\nMemoria reservada por frame (pico en step(), KB; buffers preasignados: {result['buffers_kb']:.0f} KB):")
+    print(f"  {'pantalla':<14}{'frames':>8}{'p50':>10}{'p95':>10}{'máx':>10}")
+    over = []
+    for screen, st in result['screens'].items():
+        print(f"  {screen:<14}{st['frames']:>8}{st['p50']:>10.1f}{st['p95']:>10.1f}{st['max']:>10.1f}")
+        if st['p95'] > limit_kb:
+            over.append(screen)
+    return over
+
+
+def summarize(samples):
+    """Percentiles en milisegundos por etapa."""
+    summary = {}
+    for stage, values in samples.items():
+        ms = np.array(values) * 1000
+        summary[stage] = {
+            'count': int(ms.size),
+            'mean': float(ms.mean()),
+            'p50': float(np.percentile(ms, 50)),
+            'p95': float(np.percentile(ms, 95)),
+            'p99': float(np.percentile(ms, 99)),
+        }
+    return summary
+
+
+def print_report(result):
+    print(f"\n{'Etapa':<28}{'n':>8}{'media':>10}{'p50':>10}{'p95':>10}{'p99':>10}   (ms)")
+    stages = result['stages']
+    for stage in STAGE_ORDER + sorted(set(stages) - set(STAGE_ORDER)):
+        if stage in stages:
+            st = stages[stage]
+            print(f"{stage:<28}{st['count']:>8}{st['mean']:>10.3f}{st['p50']:>10.3f}{st['p95']:>10.3f}{st['p99']:>10.3f}")
+    print()
+    for name, info in result['sessions'].items():
+        print(f"{name}: {info['frames']} frames, {info['fps']:.1f} FPS")
+    print(f"TOTAL: {result['frames']} frames, {result['fps']:.1f} FPS")
+
+
+def compare(result, baseline, tolerance):
+    """Lista de regresiones (p95 por etapa y FPS total) frente a un resultado anterior."""
+    regressions = []
+    for stage, st in result['stages'].items():
+        base = baseline['stages'].get(stage)
+        if base and st['p95'] > base['p95'] * (1 + tolerance):
+            regressions.append(f"{stage}: p95 {base['p95']:.3f} -> {st['p95']:.3f} ms")
+    if result['fps'] < baseline['fps'] * (1 - tolerance):
+        regressions.append(f"FPS: {baseline['fps']:.1f} -> {result['fps']:.1f}")
+    return regressions
+
+
+def record_session(path, source=0, seconds=20):
+    """Graba una sesión desde la cámara para añadirla al conjunto de benchmark."""
+    cap = open_source(source)
+    writer = None
+    start = time.monotonic()
+    while time.monotonic() - start < seconds:
+        ret, frame = cap.read()
+        if not ret: break
+        if writer is None:
+            h, w = frame.shape[:2]
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (w, h))
+        writer.write(frame)
+    cap.release()
+    if writer is not None:
+        writer.release()
+        print(f"Sesión guardada en {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark del pipeline de visión sobre sesiones grabadas.')
+    parser.add_argument('sessions', nargs='*', help=f'Vídeos o directorios (por defecto, todo {SESSIONS_DIR}/)')
+    parser.add_argument('--no-render', action='store_true', help='No dibujar la interfaz')
+    parser.add_argument('--json', type=str, help='Guardar el resultado en un archivo JSON')
+    parser.add_argument('--baseline', type=str, help='JSON de una ejecución anterior con el que comparar')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Empeoramiento admitido frente a la referencia')
+    parser.add_argument('--roi-mode', choices=['auto', 'serial', 'parallel', 'compare'], default='auto',
+                        help='Clasificación de las ROIs de PvP; "compare" ejecuta en serie y en paralelo')
+    parser.add_argument('--menu-level', type=int, default=MENU_PYRAMID_LEVEL,
+                        help='Nivel de la pirámide del menú (0 = resolución completa)')
+    parser.add_argument('--no-tracking', action='store_true', help='Buscar la bola del menú siempre en todo el frame')
+    parser.add_argument('--skin', choices=SKIN_BACKENDS + ('compare',), default='box',
+                        help='Segmentación de la mano; "compare" mide todas sobre las ROIs de juego')
+    parser.add_argument('--background', choices=("chroma",) + BACKGROUND_METHODS, default='chroma',
+                        help='Chroma key verde o modelo de fondo aprendido por ROI')
+    parser.add_argument('--alloc', action='store_true',
+                        help=f'Medir con tracemalloc la memoria reservada por frame (falla si p95 > {ALLOC_LIMIT_KB} KB)')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='Con --alloc, usar una sesión sintética generada en memoria (no necesita sesiones grabadas)')
+    parser.add_argument('--record', type=str, help='Grabar una sesión nueva desde la cámara en este archivo')
+    parser.add_argument('--seconds', type=float, default=20, help='Duración de la grabación')
+    args = parser.parse_args()
+
+    if args.record:
+        record_session(args.record, seconds=args.seconds)
+        sys.exit(0)
+
+    if args.synthetic and not args.alloc:
+        parser.error("--synthetic solo se usa con --alloc")
+
+    if args.synthetic:
+        sessions = [SYNTHETIC_SESSION]
+    else:
+        sessions = args.sessions or (find_sessions(SESSIONS_DIR) if os.path.isdir(SESSIONS_DIR) else [])
+    if not sessions:
+        print(f"No hay sesiones grabadas. Graba una con: python benchmark.py --record {SESSIONS_DIR}/sesion.avi")
+        sys.exit(1)
+
+    if args.skin == 'compare':
+        comparison = compare_skin_backends(sessions)
+        print_skin_comparison(comparison)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(comparison, f, indent=2)
+        sys.exit(0)
+
+    render = not args.no_render
+    if args.alloc:
+        # Sin perfilador: sus muestras también son memoria reservada en cada frame
+        parallel_rois = {'auto': None, 'serial': False, 'parallel': True, 'compare': None}[args.roi_mode]
+        allocations = measure_allocations(sessions, render=render, parallel_rois=parallel_rois,
+                                          menu_level=args.menu_level, menu_tracking=not args.no_tracking,
+                                          skin_backend=args.skin, background=args.background)
+        over = print_alloc_report(allocations)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(allocations, f, indent=2)
+        if over:
+            print(f"\nMás de {ALLOC_LIMIT_KB} KB por frame (p95) en: {', '.join(over)}")
+            sys.exit(1)
+        sys.exit(0)
+
+    profiler.enabled = True
+    profiler.keep_all = True
+    if args.roi_mode == 'compare':
+        options = {'render': render, 'menu_level': args.menu_level, 'menu_tracking': not args.no_tracking,
+                   'skin_backend': args.skin, 'background': args.background}
+        serial = run_all(sessions, parallel_rois=False, **options)
+        result = run_all(sessions, parallel_rois=True, **options)
+        print_report(result)
+        print_roi_comparison(serial, result)
+    else:
+        parallel_rois = {'auto': None, 'serial': False, 'parallel': True}[args.roi_mode]
+        result = run_all(sessions, render=render, parallel_rois=parallel_rois, menu_level=args.menu_level,
+                         menu_tracking=not args.no_tracking, skin_backend=args.skin,
+                         background=args.background)
+        print_report(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESIONES:")
+            for r in regressions:
+                print("  " + r)
+            sys.exit(1)
+        print("\nSin regresiones frente a la referencia.")
@@ -3,8 +3,127 @@ import cv2
 import glob
 import argparse
 import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 
-def calibrate_camera(image_dir, output_file="calibration_data.npz", grid_size=(9, 6), square_size=1.0):
+# termination criteria
+CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+
+def _init_worker():
+    # One OpenCV thread per process: the pool already uses every core
+    cv2.setNumThreads(1)
+
+
+def find_corners(fname, grid_size=(9, 6)):
+    """
+    Loads one image and extracts its refined chessboard corners.
+
+    Returns (fname, image_shape, corners); image_shape is None if the image
+    could not be read and corners is None if the board was not found.
+    """
+    img = cv2.imread(fname)
+    if img is None:
+        return fname, None, None
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    # Find the chess board corners
+    ret, corners = cv2.findChessboardCorners(gray, grid_size, None)
+    if not ret:
+        return fname, gray.shape[::-1], None
+
+    corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), CRITERIA)
+    return fname, gray.shape[::-1], corners
+
+
+def extract_corners(images, grid_size=(9, 6), workers=None):
+    """
+    Runs find_corners over every image, fanning them out across processes.
+
+    Yields the results in the same order as `images`, so the calibration is
+    deterministic regardless of the number of workers.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(images))
+
+    if workers <= 1:
+        for fname in images:
+            yield find_corners(fname, grid_size)
+        return
+
+    grid_sizes = [grid_size] * len(images)
+    chunksize = max(1, len(images) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        yield from executor.map(find_corners, images, grid_sizes, chunksize=chunksize)
+
+
+# Sidecar file (inside --dir) with the corners of every image already processed
+CACHE_FILE_NAME = ".corner_cache.npz"
+
+# Outlier rejection: never drop an image below this error (pixels) nor go
+# below this many images
+OUTLIER_MIN_ERROR = 0.5
+MIN_CALIBRATION_IMAGES = 5
+
+
+def file_hash(fname):
+    """SHA-1 of the file contents, used as the cache key of each image."""
+    with open(fname, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def load_corner_cache(cache_file, grid_size, square_size):
+    """
+    Loads the corner cache as {hash: (image_shape, corners or None)}.
+
+    Returns an empty cache if the file is missing, unreadable or was built
+    for a different grid_size / square_size.
+    """
+    if not cache_file or not os.path.exists(cache_file):
+        return {}
+    try:
+        with np.load(cache_file) as data:
+            if (tuple(data['grid_size']) != tuple(grid_size)
+                    or float(data['square_size']) != float(square_size)):
+                return {}
+            return {
+                str(key): (tuple(int(v) for v in shape), corners if found else None)
+                for key, shape, found, corners in zip(data['hashes'], data['shapes'], data['found'], data['corners'])
+            }
+    except (OSError, ValueError, KeyError):
+        print(f"Ignoring unreadable corner cache {cache_file}")
+        return {}
+
+
+def save_corner_cache(cache_file, entries, grid_size, square_size):
+    """Writes {hash: (image_shape, corners or None)} to the cache file."""
+    keys = sorted(entries)
+    corners = np.zeros((len(keys), grid_size[0] * grid_size[1], 1, 2), np.float32)
+    for i, key in enumerate(keys):
+        if entries[key][1] is not None:
+            corners[i] = entries[key][1]
+
+    np.savez(cache_file,
+             hashes=np.array(keys, dtype='U40'),
+             shapes=np.array([entries[key][0] for key in keys], np.int32).reshape(-1, 2),
+             found=np.array([entries[key][1] is not None for key in keys], bool),
+             corners=corners,
+             grid_size=np.array(grid_size, np.int32),
+             square_size=np.float64(square_size))
+
+
+def reprojection_errors(objpoints, imgpoints, mtx, dist, rvecs, tvecs):
+    """RMS reprojection error (pixels) of each calibration image."""
+    errors = []
+    for objp, corners, rvec, tvec in zip(objpoints, imgpoints, rvecs, tvecs):
+        projected, _ = cv2.projectPoints(objp, rvec, tvec, mtx, dist)
+        errors.append(cv2.norm(corners, projected, cv2.NORM_L2) / np.sqrt(len(projected)))
+    return errors
+
+
+def calibrate_camera(image_dir, output_file="calibration_data.npz", grid_size=(9, 6), square_size=1.0, workers=None,
+                     cache_file=None, outlier_factor=None):
     """
     Calibrates the camera using a set of checkerboard images.
     
@@ -13,10 +132,11 @@ def calibrate_camera(image_dir, output_file="calibration_data.npz", grid_size=(9
         output_file (str): Path to save the calibration data.
         grid_size (tuple): Number of inner corners per a chessboard row and column (cols, rows).
         square_size (float): Size of a square in your defined unit (e.g., mm, cm).
+        workers (int): Processes used to detect corners (default: one per core, 1 = serial).
+        cache_file (str): Corner cache path (default: CACHE_FILE_NAME inside image_dir, "" disables it).
+        outlier_factor (float): If set, report per-image reprojection errors and drop images
+            above outlier_factor times the median error, recalibrating until none are left.
     """
-    
-    # termination criteria
-    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
 
     # prepare object points, like (0,0,0), (1,0,0), (2,0,0) ....,(6,5,0)
     objp = np.zeros((grid_size[0] * grid_size[1], 3), np.float32)
@@ -26,42 +146,84 @@ def calibrate_camera(image_dir, output_file="calibration_data.npz", grid_size=(9
     # Arrays to store object points and image points from all the images.
     objpoints = [] # 3d point in real world space
     imgpoints = [] # 2d points in image plane.
+    names = []
 
-    images = glob.glob(os.path.join(image_dir, '*.jpg'))
+    images = sorted(glob.glob(os.path.join(image_dir, '*.jpg')))
     
     if not images:
         print(f"No images found in {image_dir}")
         return
 
-    print(f"Found {len(images)} images in {image_dir}. Starting processing...")
-    
+    if cache_file is None:
+        cache_file = os.path.join(image_dir, CACHE_FILE_NAME)
+    cache = load_corner_cache(cache_file, grid_size, square_size)
+    hashes = [file_hash(fname) for fname in images]
+
+    # Only new or modified images go through corner detection
+    pending = [fname for fname, key in zip(images, hashes) if key not in cache]
+
+    print(f"Found {len(images)} images in {image_dir} ({len(images) - len(pending)} cached). Starting processing...")
+
+    # Results arrive in the order of `pending` (a subsequence of `images`), so
+    # each one is logged as soon as its worker finishes
+    detected = extract_corners(pending, grid_size, workers)
+
     valid_images = 0
     img_shape = None
+    entries = {}
 
-    for fname in images:
-        img = cv2.imread(fname)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        if img_shape is None:
-            img_shape = gray.shape[::-1]
+    for i, (fname, key) in enumerate(zip(images, hashes), 1):
+        if key in cache:
+            shape, corners = cache[key]
+            source = " (cached)"
+        else:
+            _, shape, corners = next(detected)
+            source = ""
 
-        # Find the chess board corners
-        ret, corners = cv2.findChessboardCorners(gray, grid_size, None)
+        if shape is None:
+            print(f"[{i}/{len(images)}] Processed {fname} - FAILED to read image")
+            continue
 
-        # If found, add object points, image points (after refining them)
-        if ret == True:
+        entries[key] = (shape, corners)
+        if img_shape is None:
+            img_shape = shape
+
+        # If found, add object points, image points (already refined)
+        if corners is not None:
             objpoints.append(objp)
-            
-            corners2 = cv2.cornerSubPix(gray, corners, (11,11), (-1,-1), criteria)
-            imgpoints.append(corners2)
+            imgpoints.append(corners)
+            names.append(fname)
             valid_images += 1
-            print(f"Processed {fname} - OK")
+            print(f"[{i}/{len(images)}] Processed {fname} - OK{source}")
         else:
-            print(f"Processed {fname} - FAILED to detect corners")
+            print(f"[{i}/{len(images)}] Processed {fname} - FAILED to detect corners{source}")
+
+    # The cache only keeps the images currently in the directory
+    if cache_file and (pending or entries.keys() != cache.keys()):
+        save_corner_cache(cache_file, entries, grid_size, square_size)
 
     if valid_images > 0:
-        print(f"Calibrating with {valid_images} valid images...")
-        ret, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, img_shape, None, None)
+        while True:
+            print(f"Calibrating with {len(objpoints)} valid images...")
+            ret, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, img_shape, None, None)
+            if outlier_factor is None:
+                break
+
+            errors = reprojection_errors(objpoints, imgpoints, mtx, dist, rvecs, tvecs)
+            threshold = max(outlier_factor * float(np.median(errors)), OUTLIER_MIN_ERROR)
+            outliers = [i for i, error in enumerate(errors) if error > threshold]
+            for fname, error in zip(names, errors):
+                print(f"  {fname}: {error:.3f} px{' - OUTLIER' if error > threshold else ''}")
+
+            if not outliers:
+                break
+            if len(objpoints) - len(outliers) < MIN_CALIBRATION_IMAGES:
+                print(f"Keeping outliers: fewer than {MIN_CALIBRATION_IMAGES} images would remain.")
+                break
+            print(f"Dropping {len(outliers)} images above {threshold:.3f} px")
+            objpoints = [p for i, p in enumerate(objpoints) if i not in outliers]
+            imgpoints = [p for i, p in enumerate(imgpoints) if i not in outliers]
+            names = [n for i, n in enumerate(names) if i not in outliers]
 
         print(f"Calibration successful. RMS Error: {ret}")
         print("Camera Matrix:\n", mtx)
@@ -76,6 +238,14 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--dir', type=str, default='captured_images', help='Directory with images')
     parser.add_argument('--out', type=str, default='calibration_data.npz', help='Output file')
+    parser.add_argument('--workers', type=int, default=None, help='Corner detection processes (default: one per core, 1 = serial)')
+    parser.add_argument('--cache', type=str, default=None,
+                        help=f'Corner cache file (default: {CACHE_FILE_NAME} inside --dir)')
+    parser.add_argument('--no-cache', action='store_true', help='Detect corners in every image, ignoring the cache')
+    parser.add_argument('--reject-outliers', type=float, nargs='?', const=2.0, default=None, metavar='FACTOR',
+                        help='Report per-image reprojection error and drop images above FACTOR x median (default 2.0)')
     args = parser.parse_args()
     
-    calibrate_camera(args.dir, args.out)
+    calibrate_camera(args.dir, args.out, workers=args.workers,
+                     cache_file="" if args.no_cache else args.cache,
+                     outlier_factor=args.reject_outliers)
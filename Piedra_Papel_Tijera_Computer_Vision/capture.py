@@ -0,0 +1,139 @@
+import collections
+import threading
+import time
+
+from frame_source import open_source
+
+
+class RateMeter:
+    """Frecuencia (eventos/segundo) calculada sobre una ventana deslizante de tiempo."""
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self._stamps = collections.deque()
+
+    def tick(self, now=None):
+        now = time.monotonic() if now is None else now
+        self._stamps.append(now)
+        while self._stamps and now - self._stamps[0] > self.window:
+            self._stamps.popleft()
+
+    def rate(self):
+        if len(self._stamps) < 2:
+            return 0.0
+        span = self._stamps[-1] - self._stamps[0]
+        return (len(self._stamps) - 1) / span if span > 0 else 0.0
+
+
+class ThreadedCapture:
+    """
+    Captura de cámara en un hilo propio.
+
+    El hilo productor llama a cap.read() en bucle y guarda cada frame con su
+    marca de tiempo en un buffer circular acotado (se descarta el más antiguo).
+    El bucle del juego pide siempre el frame más reciente, así que las
+    esperas del driver ya no se suman al tiempo de cada frame.
+    """
+
+    def __init__(self, source=0, buffer_size=8):
+        self.source = source
+        # Cámara, vídeo o directorio de imágenes (los grabados se reproducen a su velocidad real)
+        self.cap = open_source(source, realtime=True)
+        self._buffer = collections.deque(maxlen=buffer_size)  # (frame_id, timestamp, frame)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._finished = False
+
+        self._next_id = 0
+        self._last_read_id = -1
+        self._last_frame = None
+        self.last_timestamp = None  # Marca de tiempo del último frame devuelto por read()
+
+        self.grabbed = 0
+        self.processed = 0
+        self.dropped = 0
+        self._grab_rate = RateMeter()
+        self._process_rate = RateMeter()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while self._running:
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            now = time.monotonic()
+            with self._cond:
+                self._buffer.append((self._next_id, now, frame))
+                self._next_id += 1
+                self.grabbed += 1
+                self._grab_rate.tick(now)
+                self._cond.notify_all()
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+
+    def read(self, timeout=0.1):
+        """
+        Devuelve (ret, frame) con el frame más reciente.
+
+        Espera como mucho `timeout` segundos a que llegue un frame nuevo; si no
+        llega, repite el último para que la interfaz siga respondiendo.
+        Los frames que quedaron sin procesar entre dos lecturas cuentan como descartados.
+        """
+        with self._cond:
+            deadline = time.monotonic() + timeout
+            while not self._has_new() and not self._finished:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            if self._has_new():
+                frame_id, timestamp, frame = self._buffer[-1]
+                if self._last_read_id >= 0:
+                    self.dropped += frame_id - self._last_read_id - 1
+                self._last_read_id = frame_id
+                self._last_frame = frame
+                self.last_timestamp = timestamp
+                self.processed += 1
+                self._process_rate.tick()
+            elif self._finished:
+                return False, None
+
+            return self._last_frame is not None, self._last_frame
+
+    def _has_new(self):
+        return bool(self._buffer) and self._buffer[-1][0] != self._last_read_id
+
+    def latest_timestamp(self):
+        """Marca de tiempo (time.monotonic) del frame más reciente, o None."""
+        with self._cond:
+            return self._buffer[-1][1] if self._buffer else None
+
+    def stats(self):
+        """Contadores del productor (captura) y del consumidor (procesado) por separado."""
+        with self._cond:
+            return {
+                'grab_fps': self._grab_rate.rate(),
+                'process_fps': self._process_rate.rate(),
+                'grabbed': self.grabbed,
+                'processed': self.processed,
+                'dropped': self.dropped,
+            }
+
+    def release(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self.cap.release()
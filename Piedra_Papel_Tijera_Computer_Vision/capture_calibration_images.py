@@ -1,16 +1,68 @@
 import cv2
 import os
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
-def capture_images(output_dir, quantity=20, grid_size=(9, 6)):
+from frame_source import open_source
+
+# The preview looks for the board on a frame at most this wide
+PREVIEW_MAX_WIDTH = 400
+PREVIEW_FLAGS = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK
+
+
+def find_preview_corners(gray, grid_size, scale):
+    """
+    Quick board check on a downscaled frame (CALIB_CB_FAST_CHECK exits early
+    when no board is visible). Returns the corners in full-resolution
+    coordinates, or None.
+    """
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    found, corners = cv2.findChessboardCorners(gray, grid_size, PREVIEW_FLAGS)
+    if not found:
+        return None
+    return corners / scale if scale < 1.0 else corners
+
+
+class PreviewDetector:
+    """
+    Runs find_preview_corners in a background thread so the preview never
+    waits for it: each frame is submitted only when the previous detection
+    has finished, and the preview draws the latest available result.
+    """
+
+    def __init__(self, grid_size):
+        self.grid_size = grid_size
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chessboard")
+        self.future = None
+        self.corners = None
+
+    def update(self, frame):
+        if self.future is not None and self.future.done():
+            self.corners = self.future.result()
+            self.future = None
+
+        if self.future is None:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            scale = min(1.0, PREVIEW_MAX_WIDTH / gray.shape[1])
+            self.future = self.executor.submit(find_preview_corners, gray, self.grid_size, scale)
+
+        return self.corners
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def capture_images(output_dir, quantity=20, grid_size=(9, 6), source=0):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    cap = cv2.VideoCapture(0)
+    cap = open_source(source)
     if not cap.isOpened():
         print("Error: Could not open webcam.")
         return
 
+    detector = PreviewDetector(grid_size)
     count = 0
     print(f"Press 'C' to capture image. Need {quantity} images.")
     print("Press 'Q' to quit.")
@@ -21,13 +73,12 @@ def capture_images(output_dir, quantity=20, grid_size=(9, 6)):
             break
         
         display_frame = frame.copy()
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Find chess board corners
-        ret_corners, corners = cv2.findChessboardCorners(gray, grid_size, None)
 
-        if ret_corners:
-            cv2.drawChessboardCorners(display_frame, grid_size, corners, ret_corners)
+        # Corners from the latest background detection (downscaled, fast check)
+        corners = detector.update(frame)
+
+        if corners is not None:
+            cv2.drawChessboardCorners(display_frame, grid_size, corners, True)
             cv2.putText(display_frame, "PATTERN DETECTED! Press 'C'", (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
         else:
             cv2.putText(display_frame, "Pattern NOT detected", (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
@@ -38,6 +89,9 @@ def capture_images(output_dir, quantity=20, grid_size=(9, 6)):
 
         key = cv2.waitKey(1) & 0xFF
         if key == ord('c'):
+            # Only the saved frame gets the full-resolution detection
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            ret_corners, _ = cv2.findChessboardCorners(gray, grid_size, None)
             if ret_corners:
                 filename = os.path.join(output_dir, f"calib_{count:02d}.jpg")
                 cv2.imwrite(filename, frame) # Save original frame, not the one with drawn corners
@@ -52,6 +106,7 @@ def capture_images(output_dir, quantity=20, grid_size=(9, 6)):
         elif key == ord('q'):
             break
 
+    detector.close()
     cap.release()
     cv2.destroyAllWindows()
     
@@ -63,6 +118,7 @@ def capture_images(output_dir, quantity=20, grid_size=(9, 6)):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Capture images for camera calibration.')
     parser.add_argument('--dir', type=str, default='captured_images', help='Output directory for images')
+    parser.add_argument('--source', type=str, default='0', help='Camera index, video file or image directory')
     args = parser.parse_args()
     
-    capture_images(args.dir)
+    capture_images(args.dir, source=args.source)
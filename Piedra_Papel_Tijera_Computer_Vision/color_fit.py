@@ -0,0 +1,149 @@
+import cv2
+import numpy as np
+
+from color_profile import SKIN_HIST_BINS, SKIN_PROB_THRESHOLD
+
+# Histograma HSV conjunto de las muestras: H a resolución completa, S y V en
+# bins de 4 niveles (180 x 64 x 64 floats, ~3 MB). Sus dos primeros ejes son
+# los de la tabla de retroproyección del perfil.
+HIST_BINS = SKIN_HIST_BINS + (64,)
+HIST_RANGES = [0, 180, 0, 256, 0, 256]
+BIN_WIDTH = np.array([180 // HIST_BINS[0], 256 // HIST_BINS[1], 256 // HIST_BINS[2]])
+HSV_MAX = np.array([179, 255, 255])
+
+# Fracción de las muestras que debe cubrir cada canal y holgura añadida a cada lado
+FIT_COVERAGE = 0.98
+FIT_MARGIN = np.array([2, 8, 8])
+
+# Al limpiar las muestras de piel se descarta también el fondo cercano a su caja
+# (verde con otra exposición o sombreado)
+CLEAN_MARGIN = np.array([4, 24, 24])
+
+# Tabla de probabilidad H-S: suavizado de las densidades (en bins) y densidad
+# mínima para considerar piel un color (los colores nunca vistos quedan en 0)
+HIST_SMOOTH_SIGMA = 1.0
+HIST_DENSITY_FLOOR = 1e-5
+
+
+class HSVHistogram:
+    """Histograma 3D acumulado de los píxeles HSV de varias muestras."""
+
+    def __init__(self):
+        self.counts = np.zeros(HIST_BINS, np.float32)
+
+    def add(self, hsv, mask=None):
+        self.counts += cv2.calcHist([hsv], [0, 1, 2], mask, list(HIST_BINS), HIST_RANGES)
+
+    @property
+    def total(self):
+        return float(self.counts.sum())
+
+
+def _box_bins(lower, upper):
+    """Rango de bins (inicio, fin exclusivo) por canal que cubre la caja [lower, upper]."""
+    lower = np.asarray(lower) // BIN_WIDTH
+    upper = np.asarray(upper) // BIN_WIDTH + 1
+    return tuple(slice(int(lo), int(hi)) for lo, hi in zip(lower, upper))
+
+
+def _shortest_interval(marginal, coverage):
+    """Intervalo de bins más corto que contiene `coverage` de la masa del histograma 1D."""
+    cumulative = np.concatenate(([0.0], np.cumsum(marginal, dtype=np.float64)))
+    needed = coverage * cumulative[-1]
+    # Para cada inicio, primer fin cuya masa acumulada alcanza la necesaria
+    ends = np.searchsorted(cumulative, cumulative[:-1] + needed, side='left')
+    valid = ends < len(cumulative)
+    starts = np.flatnonzero(valid)
+    best = starts[np.argmin(ends[valid] - starts)]
+    return best, ends[best] - 1
+
+
+def fit_box(counts, coverage=FIT_COVERAGE):
+    """Caja HSV (lower, upper) que cubre `coverage` de las muestras en cada canal."""
+    lower, upper = [], []
+    for axis in range(3):
+        marginal = counts.sum(axis=tuple(a for a in range(3) if a != axis))
+        first, last = _shortest_interval(marginal, coverage)
+        lower.append(first * BIN_WIDTH[axis])
+        upper.append((last + 1) * BIN_WIDTH[axis] - 1)
+    lower = np.clip(np.array(lower) - FIT_MARGIN, 0, HSV_MAX)
+    upper = np.clip(np.array(upper) + FIT_MARGIN, 0, HSV_MAX)
+    return lower, upper
+
+
+def _fg_fraction(counts, skin, bg_box):
+    """
+    Fracción de la masa que acaba en la máscara final: dentro de piel y fuera de
+    fondo. `skin` es la caja (lower, upper) o una máscara H-S de la tabla.
+    """
+    inside = np.zeros(HIST_BINS, bool)
+    if isinstance(skin, tuple):
+        inside[_box_bins(*skin)] = True
+    else:
+        inside[skin] = True
+    inside[_box_bins(*bg_box)] = False
+    total = counts.sum()
+    return float(counts[inside].sum() / total) if total else 0.0
+
+
+def _smooth_density(counts):
+    """Densidad H-S normalizada y suavizada; el tono es circular (179 junto a 0)."""
+    density = counts / max(float(counts.sum()), 1.0)
+    pad = int(3 * HIST_SMOOTH_SIGMA) + 1
+    wrapped = np.pad(density, ((pad, pad), (0, 0)), mode='wrap').astype(np.float32)
+    smoothed = cv2.GaussianBlur(wrapped, (0, 0), HIST_SMOOTH_SIGMA, borderType=cv2.BORDER_REPLICATE)
+    return smoothed[pad:-pad]
+
+
+def fit_skin_histogram(skin_counts, bg_counts):
+    """
+    Tabla de probabilidad de piel P(piel | H, S) en 0..255 a partir de los
+    histogramas 3D de piel (ya limpio de fondo) y fondo, con priors iguales.
+    """
+    skin = _smooth_density(skin_counts.sum(axis=2))
+    bg = _smooth_density(bg_counts.sum(axis=2))
+    prob = skin / (skin + bg + HIST_DENSITY_FLOOR)
+    return np.round(prob * 255).astype(np.uint8)
+
+
+def fit_thresholds(skin_hist, bg_hist, coverage=FIT_COVERAGE):
+    """
+    Ajusta los umbrales de piel y fondo a partir de los histogramas de muestras.
+
+    Primero se ajusta la caja del fondo. Las muestras de piel incluyen el verde
+    visible alrededor de la mano: se estima cuántos píxeles de fondo contienen
+    (por su masa dentro de la caja del fondo) y se resta el histograma del fondo
+    escalado a esa cantidad; después se descarta lo que queda en la caja del
+    fondo ampliada con CLEAN_MARGIN.
+
+    Devuelve la configuración en el formato de color_config.npy, incluida la
+    tabla 'skin_hist' de la retroproyección, y las métricas del ajuste sobre las
+    propias muestras: 'skin_recall' (piel que pasa la máscara final) y 'bg_leak'
+    (fondo que la pasa), con la caja y con la tabla ('hist_recall', 'hist_leak').
+    """
+    bg_lower, bg_upper = fit_box(bg_hist.counts, coverage)
+
+    bg_bins = _box_bins(bg_lower, bg_upper)
+    bg_inside = bg_hist.counts[bg_bins].sum() / bg_hist.total
+    bg_in_skin = skin_hist.counts[bg_bins].sum() / bg_inside
+    skin_counts = np.maximum(skin_hist.counts - bg_hist.counts * (bg_in_skin / bg_hist.total), 0)
+    skin_counts[_box_bins(np.clip(bg_lower - CLEAN_MARGIN, 0, HSV_MAX),
+                          np.clip(bg_upper + CLEAN_MARGIN, 0, HSV_MAX))] = 0
+    if not skin_counts.any():
+        raise ValueError("no hay muestras de piel fuera del rango del fondo")
+    skin_lower, skin_upper = fit_box(skin_counts, coverage)
+
+    skin_hist = fit_skin_histogram(skin_counts, bg_hist.counts)
+
+    skin_box = (skin_lower, skin_upper)
+    bg_box = (bg_lower, bg_upper)
+    hist_mask = skin_hist >= SKIN_PROB_THRESHOLD
+    return {
+        'skin_lower': skin_lower, 'skin_upper': skin_upper,
+        'bg_lower': bg_lower, 'bg_upper': bg_upper,
+        'skin_hist': skin_hist,
+        'skin_recall': _fg_fraction(skin_counts, skin_box, bg_box),
+        'bg_leak': _fg_fraction(bg_hist.counts, skin_box, bg_box),
+        'hist_recall': _fg_fraction(skin_counts, hist_mask, bg_box),
+        'hist_leak': _fg_fraction(bg_hist.counts, hist_mask, bg_box),
+    }
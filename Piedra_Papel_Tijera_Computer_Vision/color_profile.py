@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+import numpy as np
+
+# Archivo de configuración generado por color_tuner.py
+CONFIG_FILE = "color_config.npy"
+
+# Valores por defecto (Fallback)
+DEFAULT_SKIN_LOWER = (0, 30, 60)
+DEFAULT_SKIN_UPPER = (20, 255, 255)
+DEFAULT_BG_LOWER = (35, 50, 50)
+DEFAULT_BG_UPPER = (85, 255, 255)
+
+# Límites válidos de cada canal HSV en OpenCV
+HSV_LIMITS = np.array([180, 255, 255])
+
+CONFIG_KEYS = ('skin_lower', 'skin_upper', 'bg_lower', 'bg_upper')
+
+# Tabla opcional de probabilidad de piel (0..255) por bins de H y S, usada por
+# la segmentación por retroproyección. S se agrupa en bins de 4 niveles.
+SKIN_HIST_KEY = 'skin_hist'
+SKIN_HIST_BINS = (180, 64)
+# Probabilidad mínima (0..255) para que un píxel retroproyectado cuente como piel
+SKIN_PROB_THRESHOLD = 128
+
+
+def _hs_bins(lower, upper):
+    s_bin = 256 // SKIN_HIST_BINS[1]
+    return slice(int(lower[0]), int(upper[0]) + 1), slice(int(lower[1]) // s_bin, int(upper[1]) // s_bin + 1)
+
+
+def box_histogram(lower, upper):
+    """Tabla H-S equivalente a la caja de piel (sin el límite de V): 255 dentro, 0 fuera."""
+    hist = np.zeros(SKIN_HIST_BINS, np.float32)
+    hist[_hs_bins(lower, upper)] = 255
+    return hist
+
+
+def segmentation_table(hist, bg_lower, bg_upper):
+    """
+    Tabla que usa calcBackProject: 255 donde la probabilidad de piel alcanza
+    SKIN_PROB_THRESHOLD y 0 en el resto, también en el rectángulo H-S del
+    chroma key. Así la retroproyección ya es la máscara final de la mano.
+    """
+    table = np.where(np.asarray(hist) >= SKIN_PROB_THRESHOLD, 255, 0).astype(np.float32)
+    table[_hs_bins(bg_lower, bg_upper)] = 0
+    return table
+
+
+def _validate(conf):
+    """Comprueba que la configuración tiene los cuatro umbrales HSV bien formados."""
+    values = {}
+    for key in CONFIG_KEYS:
+        if key not in conf:
+            raise ValueError(f"falta la clave '{key}'")
+        arr = np.asarray(conf[key]).reshape(-1)
+        if arr.shape != (3,):
+            raise ValueError(f"'{key}' debe tener 3 valores (H, S, V)")
+        if np.any(arr < 0) or np.any(arr > HSV_LIMITS):
+            raise ValueError(f"'{key}' fuera de rango HSV: {arr.tolist()}")
+        values[key] = arr
+    for prefix in ('skin', 'bg'):
+        if np.any(values[prefix + '_lower'] > values[prefix + '_upper']):
+            raise ValueError(f"'{prefix}_lower' mayor que '{prefix}_upper'")
+
+    # Sin tabla aprendida, la retroproyección usa la caja de piel
+    if SKIN_HIST_KEY in conf:
+        hist = np.asarray(conf[SKIN_HIST_KEY], dtype=np.float32)
+        if hist.shape != SKIN_HIST_BINS:
+            raise ValueError(f"'{SKIN_HIST_KEY}' debe medir {SKIN_HIST_BINS}")
+        if np.any(hist < 0) or np.any(hist > 255):
+            raise ValueError(f"'{SKIN_HIST_KEY}' fuera de rango (0..255)")
+    else:
+        hist = box_histogram(values['skin_lower'], values['skin_upper'])
+    values['skin_table'] = segmentation_table(hist, values['bg_lower'], values['bg_upper'])
+    return values
+
+
+class ColorProfile:
+    """
+    Umbrales de piel y chroma key cargados una sola vez en memoria.
+
+    Los arrays son contiguos (uint8; la tabla skin_table, float32 para
+    calcBackProject) y de solo lectura. Cada recarga construye un juego nuevo
+    completo y lo sustituye bajo el cerrojo, así que current() devuelve siempre
+    umbrales de una misma configuración aunque las ROIs se clasifiquen en
+    paralelo mientras color_tuner.py guarda otra.
+    El archivo solo se vuelve a leer cuando cambia su mtime, comprobándolo como
+    mucho una vez cada `check_interval` segundos, para que color_tuner.py pueda
+    reajustar los valores en caliente.
+    """
+
+    def __init__(self, path=CONFIG_FILE, check_interval=0.5):
+        self.path = path
+        self.check_interval = check_interval
+        self._values = self._pinned_values({
+            'skin_lower': DEFAULT_SKIN_LOWER, 'skin_upper': DEFAULT_SKIN_UPPER,
+            'bg_lower': DEFAULT_BG_LOWER, 'bg_upper': DEFAULT_BG_UPPER,
+            'skin_table': segmentation_table(box_histogram(DEFAULT_SKIN_LOWER, DEFAULT_SKIN_UPPER),
+                                             DEFAULT_BG_LOWER, DEFAULT_BG_UPPER),
+        })
+        self.loaded = False
+        self.reloads = 0
+        self._mtime = None
+        self._failed_mtime = None  # mtime de la última versión inválida (ya avisada)
+        self._last_check = -float('inf')
+        # Las ROIs de PvP pueden clasificarse en paralelo: la recarga no debe
+        # solaparse y el cambio de umbrales no debe verse a medias
+        self._reload_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.refresh(force=True)
+
+    @staticmethod
+    def _pinned(values, dtype=np.uint8):
+        arr = np.ascontiguousarray(values, dtype=dtype)
+        arr.flags.writeable = False
+        return arr
+
+    @classmethod
+    def _pinned_values(cls, values):
+        return {key: cls._pinned(arr, np.float32 if key == 'skin_table' else np.uint8)
+                for key, arr in values.items()}
+
+    def current(self):
+        """Umbrales vigentes: diccionario de solo lectura que no cambia al recargar."""
+        with self._lock:
+            return self._values
+
+    @property
+    def skin_lower(self):
+        return self.current()['skin_lower']
+
+    @property
+    def skin_upper(self):
+        return self.current()['skin_upper']
+
+    @property
+    def bg_lower(self):
+        return self.current()['bg_lower']
+
+    @property
+    def bg_upper(self):
+        return self.current()['bg_upper']
+
+    @property
+    def skin_table(self):
+        return self.current()['skin_table']
+
+    def refresh(self, force=False):
+        """Recarga el archivo si su mtime ha cambiado. Devuelve True si se recargó."""
+        with self._reload_lock:
+            return self._reload_if_changed(force)
+
+    def _reload_if_changed(self, force):
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._mtime or mtime == self._failed_mtime:
+            return False
+
+        # Se lee y valida fuera de _lock: los lectores siguen con los umbrales actuales
+        try:
+            conf = np.load(self.path, allow_pickle=True).item()
+            values = self._pinned_values(_validate(conf))
+        except Exception as e:
+            # Se conservan los umbrales anteriores; solo se vuelve a avisar si el archivo cambia
+            print(f"Configuración de color inválida en {self.path}: {e}")
+            self._failed_mtime = mtime
+            return False
+
+        with self._lock:
+            self._values = values
+            self._mtime = mtime
+            self._failed_mtime = None
+            self.loaded = True
+            self.reloads += 1
+        return True
+
+
+def _legacy_load(path):
+    """Ruta antigua de detect_gesture: stat + np.load en cada llamada."""
+    l_green = np.array(DEFAULT_BG_LOWER)
+    u_green = np.array(DEFAULT_BG_UPPER)
+    l_skin = np.array(DEFAULT_SKIN_LOWER)
+    u_skin = np.array(DEFAULT_SKIN_UPPER)
+    if os.path.exists(path):
+        try:
+            conf = np.load(path, allow_pickle=True).item()
+            l_green = conf['bg_lower']
+            u_green = conf['bg_upper']
+            l_skin = conf['skin_lower']
+            u_skin = conf['skin_upper']
+        except Exception: pass
+    return l_skin, u_skin, l_green, u_green
+
+
+def measure_savings(path=CONFIG_FILE, iterations=500, rois_per_frame=2):
+    """Mide cuánta latencia por frame elimina el perfil frente a cargar el archivo en cada llamada."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        _legacy_load(path)
+    legacy_ms = (time.perf_counter() - start) * 1000 / iterations
+
+    profile = ColorProfile(path)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        profile.refresh()
+        profile.skin_lower, profile.skin_upper, profile.bg_lower, profile.bg_upper
+    cached_ms = (time.perf_counter() - start) * 1000 / iterations
+
+    return {
+        'legacy_ms_per_call': legacy_ms,
+        'cached_ms_per_call': cached_ms,
+        'saved_ms_per_frame': (legacy_ms - cached_ms) * rois_per_frame,
+    }
+
+
+if __name__ == "__main__":
+    result = measure_savings()
+    print(f"Carga por llamada (antes): {result['legacy_ms_per_call']:.3f} ms")
+    print(f"Perfil en memoria (ahora): {result['cached_ms_per_call']:.4f} ms")
+    print(f"Latencia eliminada por frame (PvP, 2 ROIs): {result['saved_ms_per_frame']:.3f} ms")
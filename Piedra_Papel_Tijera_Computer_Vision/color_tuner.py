@@ -1,44 +1,224 @@
 import cv2
 import numpy as np
 import os
+import argparse
+
+from frame_source import open_source
+from color_fit import HSVHistogram, fit_thresholds
 
 # Archivo de configuración
 CONFIG_FILE = "color_config.npy"
 
-def nothing(x):
-    pass
+# Escala de la vista previa: cada cuadrante del collage mide la mitad del frame
+PREVIEW_SCALE = 0.5
+
+# (nombre, grupo, índice, valor inicial, máximo). Los índices siguen el orden
+# H min, H max, S min, S max, V min, V max de cada grupo.
+TRACKBARS = (
+    # Piel
+    ('Skin H Min', 'skin', 0, 0, 179),
+    ('Skin H Max', 'skin', 1, 20, 179),
+    ('Skin S Min', 'skin', 2, 30, 255),
+    ('Skin S Max', 'skin', 3, 255, 255),
+    ('Skin V Min', 'skin', 4, 60, 255),
+    ('Skin V Max', 'skin', 5, 255, 255),
+    # Fondo Verde
+    ('Bg H Min', 'bg', 0, 35, 179),
+    ('Bg H Max', 'bg', 1, 85, 179),
+    ('Bg S Min', 'bg', 2, 50, 255),
+    ('Bg S Max', 'bg', 3, 255, 255),
+    ('Bg V Min', 'bg', 4, 50, 255),
+    ('Bg V Max', 'bg', 5, 255, 255),
+)
+
+# Modo automático: recuadro de muestreo (fracciones del frame x1, y1, x2, y2)
+# y frames muestreados en cada fase
+SAMPLE_BOX = (0.3, 0.2, 0.7, 0.8)
+AUTO_FRAMES = 150
+
+LABELS = {
+    'skin': ("1. SKIN MASK (Busca blanco en mano)", (0, 0, 255)),
+    'bg': ("2. BG MASK (Busca blanco en fondo)", (0, 255, 0)),
+    'final': ("3. RESULTADO (Mano blanca, fondo negro)", (0, 255, 255)),
+}
+
+class ColorTuner:
+    """
+    Estado del calibrador: el HSV del frame a media resolución, las máscaras
+    y un único collage preasignado cuyos cuadrantes se reescriben en sitio.
+
+    Cada máscara solo se recalcula cuando cambia el frame o los umbrales de su
+    grupo; con el frame congelado, mover un slider de piel no toca el fondo.
+    """
+
+    def __init__(self, config=None):
+        self.values = {'skin': [0] * 6, 'bg': [0] * 6}
+        for name, group, index, initial, maximum in TRACKBARS:
+            self.values[group][index] = initial
+        # Valores de partida de un ajuste automático (mismo formato que color_config.npy)
+        if config is not None:
+            for group in ('skin', 'bg'):
+                lower, upper = config[group + '_lower'], config[group + '_upper']
+                self.values[group] = [int(v) for pair in zip(lower, upper) for v in pair]
+        self.dirty = {'skin': True, 'bg': True}
+        self.shape = None
+
+    def _allocate(self, frame_shape):
+        h, w = frame_shape[:2]
+        sh, sw = int(round(h * PREVIEW_SCALE)), int(round(w * PREVIEW_SCALE))
+        self.shape = frame_shape[:2]
+        self.collage = np.zeros((2 * sh, 2 * sw, 3), np.uint8)
+        self.quadrants = {
+            'frame': self.collage[:sh, :sw],
+            'final': self.collage[:sh, sw:],
+            'skin': self.collage[sh:, :sw],
+            'bg': self.collage[sh:, sw:],
+        }
+        self.small = np.empty((sh, sw, 3), np.uint8)
+        self.hsv = np.empty((sh, sw, 3), np.uint8)
+        self.masks = {group: np.empty((sh, sw), np.uint8) for group in ('skin', 'bg', 'not_bg', 'final')}
+
+    def set_value(self, group, index, value):
+        if self.values[group][index] != value:
+            self.values[group][index] = value
+            self.dirty[group] = True
+
+    def bounds(self, group):
+        values = self.values[group]
+        return np.array(values[0::2]), np.array(values[1::2])
+
+    def set_frame(self, frame):
+        """Reduce y espeja el frame en su cuadrante y calcula el HSV una sola vez."""
+        if self.shape != frame.shape[:2]:
+            self._allocate(frame.shape)
+        cv2.resize(frame, (self.small.shape[1], self.small.shape[0]), dst=self.small)
+        cv2.flip(self.small, 1, dst=self.quadrants['frame'])
+        cv2.cvtColor(self.quadrants['frame'], cv2.COLOR_BGR2HSV, dst=self.hsv)
+        self.dirty['skin'] = self.dirty['bg'] = True
 
-def save_config(skin_min, skin_max, green_min, green_max):
+    def _show_mask(self, name):
+        quadrant = self.quadrants[name]
+        cv2.cvtColor(self.masks[name], cv2.COLOR_GRAY2BGR, dst=quadrant)
+        text, color = LABELS[name]
+        cv2.putText(quadrant, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+
+    def render(self):
+        """Recalcula solo las máscaras afectadas y devuelve el collage."""
+        if not (self.dirty['skin'] or self.dirty['bg']):
+            return self.collage
+
+        for group in ('skin', 'bg'):
+            if self.dirty[group]:
+                lower, upper = self.bounds(group)
+                cv2.inRange(self.hsv, lower, upper, dst=self.masks[group])
+                self._show_mask(group)
+                self.dirty[group] = False
+
+        # Combinación: Piel AND NOT Fondo
+        cv2.bitwise_not(self.masks['bg'], dst=self.masks['not_bg'])
+        cv2.bitwise_and(self.masks['skin'], self.masks['not_bg'], dst=self.masks['final'])
+        self._show_mask('final')
+        return self.collage
+
+def save_config(skin_min, skin_max, green_min, green_max, skin_hist=None):
     data = {
         'skin_lower': skin_min,
         'skin_upper': skin_max,
         'bg_lower': green_min,
         'bg_upper': green_max
     }
-    np.save(CONFIG_FILE, data)
+    # Tabla H-S de la segmentación por retroproyección (solo tras un ajuste automático)
+    if skin_hist is not None:
+        data['skin_hist'] = skin_hist
+    # Escritura atómica: final.py recarga el archivo en caliente al cambiar su mtime
+    tmp_file = CONFIG_FILE + ".tmp"
+    with open(tmp_file, 'wb') as f:
+        np.save(f, data)
+    os.replace(tmp_file, CONFIG_FILE)
     print(f"Configuración guardada en {CONFIG_FILE}")
 
-def main():
-    cap = cv2.VideoCapture(0)
+def sample_box(shape):
+    h, w = shape[:2]
+    return (int(w * SAMPLE_BOX[0]), int(h * SAMPLE_BOX[1]), int(w * SAMPLE_BOX[2]), int(h * SAMPLE_BOX[3]))
+
+def _sample_phase(cap, hist, prompt, frames):
+    """
+    Espera a ESPACIO y acumula en `hist` el HSV del recuadro durante `frames`
+    frames. Devuelve False si se cancela (q) o se acaba la fuente.
+    """
+    sampled = None  # None mientras se espera a ESPACIO
+    while sampled is None or sampled < frames:
+        ret, frame = cap.read()
+        if not ret: return False
+
+        frame = cv2.flip(frame, 1)
+        x1, y1, x2, y2 = sample_box(frame.shape)
+        if sampled is not None:
+            hist.add(cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2HSV))
+            sampled += 1
+            prompt_text = f"Muestreando {sampled}/{frames}..."
+        else:
+            prompt_text = prompt
+
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 255), 2)
+        cv2.putText(frame, prompt_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+        cv2.imshow('Calibrador', frame)
+
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('q'):
+            return False
+        if key == ord(' ') and sampled is None:
+            sampled = 0
+    return True
+
+def auto_calibrate(cap, frames=AUTO_FRAMES):
+    """
+    Muestrea el fondo con el recuadro vacío y después la mano dentro del
+    recuadro, acumulando un histograma HSV de cada fase, y ajusta los umbrales
+    con fit_thresholds. Si la piel no se distingue del fondo se repite la fase
+    de la mano. Devuelve el ajuste o None si se cancela.
+    """
+    bg_hist = HSVHistogram()
+    if not _sample_phase(cap, bg_hist, "FONDO: deja el recuadro vacio y pulsa ESPACIO", frames):
+        return None
+
+    prompt = "PIEL: pon la mano en el recuadro y pulsa ESPACIO"
+    while True:
+        skin_hist = HSVHistogram()
+        if not _sample_phase(cap, skin_hist, prompt, frames):
+            return None
+        try:
+            fit = fit_thresholds(skin_hist, bg_hist)
+            break
+        except ValueError as e:
+            print(f"Ajuste automático fallido: {e}. Repite la muestra de la mano.")
+            prompt = "Sin piel distinta del fondo: repite con la mano y pulsa ESPACIO"
+
+    print(f"Ajuste automático: piel {fit['skin_lower'].tolist()}-{fit['skin_upper'].tolist()}, "
+          f"fondo {fit['bg_lower'].tolist()}-{fit['bg_upper'].tolist()}")
+    print(f"  Piel detectada: {fit['skin_recall']:.1%}  Fondo que pasa como piel: {fit['bg_leak']:.1%}")
+    print(f"  Con la tabla H-S (--skin backproject): {fit['hist_recall']:.1%} / {fit['hist_leak']:.1%}")
+    return fit
+
+def main(source=0, auto=False):
+    cap = open_source(source)
     
     cv2.namedWindow('Calibrador')
+
+    # En modo automático los sliders parten de los umbrales ajustados
+    fit = None
+    if auto:
+        fit = auto_calibrate(cap)
+        if fit is None:
+            cap.release()
+            cv2.destroyAllWindows()
+            return
+    tuner = ColorTuner(fit)
     
-    # Valores iniciales (Defaults)
-    # Piel
-    cv2.createTrackbar('Skin H Min', 'Calibrador', 0, 179, nothing)
-    cv2.createTrackbar('Skin H Max', 'Calibrador', 20, 179, nothing)
-    cv2.createTrackbar('Skin S Min', 'Calibrador', 30, 255, nothing)
-    cv2.createTrackbar('Skin S Max', 'Calibrador', 255, 255, nothing)
-    cv2.createTrackbar('Skin V Min', 'Calibrador', 60, 255, nothing)
-    cv2.createTrackbar('Skin V Max', 'Calibrador', 255, 255, nothing)
-    
-    # Fondo Verde
-    cv2.createTrackbar('Bg H Min', 'Calibrador', 35, 179, nothing)
-    cv2.createTrackbar('Bg H Max', 'Calibrador', 85, 179, nothing)
-    cv2.createTrackbar('Bg S Min', 'Calibrador', 50, 255, nothing)
-    cv2.createTrackbar('Bg S Max', 'Calibrador', 255, 255, nothing)
-    cv2.createTrackbar('Bg V Min', 'Calibrador', 50, 255, nothing)
-    cv2.createTrackbar('Bg V Max', 'Calibrador', 255, 255, nothing)
+    # Cada slider avisa al calibrador, que marca su grupo para recalcular
+    for name, group, index, initial, maximum in TRACKBARS:
+        cv2.createTrackbar(name, 'Calibrador', tuner.values[group][index], maximum,
+                           lambda value, group=group, index=index: tuner.set_value(group, index, value))
     
     print("----------------------------------------------------------------")
     print("INSTRUCCIONES DE CALIBRACIÓN:")
@@ -46,74 +226,38 @@ def main():
     print("2. Ajusta los sliders de 'Bg' para que el FONDO VERDE se vea BLANCO en 'Green Mask'.")
     print("3. La ventana 'RESULTADO FINAL' debe mostrar SOLO tus manos (blancas) y fondo negro.")
     print("   (Si hay ruido negro en las manos, ajusta Piel. Si hay ruido blanco en fondo, ajusta Bg)")
-    print("4. Pulsa 'S' para GUARDAR y SALIR.")
-    print("5. Pulsa 'Q' para salir SIN guardar.")
+    print("4. Pulsa 'P' para CONGELAR el frame y ajustar sobre una imagen fija.")
+    print("5. Pulsa 'S' para GUARDAR y SALIR.")
+    print("6. Pulsa 'Q' para salir SIN guardar.")
     print("----------------------------------------------------------------")
 
+    paused = False
     while True:
-        ret, frame = cap.read()
-        if not ret: break
+        if not paused or tuner.shape is None:
+            ret, frame = cap.read()
+            if not ret: break
+            tuner.set_frame(frame)
         
-        frame = cv2.flip(frame, 1)
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        
-        # Leer trackbars
-        s_h_min = cv2.getTrackbarPos('Skin H Min', 'Calibrador')
-        s_h_max = cv2.getTrackbarPos('Skin H Max', 'Calibrador')
-        s_s_min = cv2.getTrackbarPos('Skin S Min', 'Calibrador')
-        s_s_max = cv2.getTrackbarPos('Skin S Max', 'Calibrador')
-        s_v_min = cv2.getTrackbarPos('Skin V Min', 'Calibrador')
-        s_v_max = cv2.getTrackbarPos('Skin V Max', 'Calibrador')
-        
-        b_h_min = cv2.getTrackbarPos('Bg H Min', 'Calibrador')
-        b_h_max = cv2.getTrackbarPos('Bg H Max', 'Calibrador')
-        b_s_min = cv2.getTrackbarPos('Bg S Min', 'Calibrador')
-        b_s_max = cv2.getTrackbarPos('Bg S Max', 'Calibrador')
-        b_v_min = cv2.getTrackbarPos('Bg V Min', 'Calibrador')
-        b_v_max = cv2.getTrackbarPos('Bg V Max', 'Calibrador')
-        
-        # Crear arrays
-        lower_skin = np.array([s_h_min, s_s_min, s_v_min])
-        upper_skin = np.array([s_h_max, s_s_max, s_v_max])
-        
-        lower_bg = np.array([b_h_min, b_s_min, b_v_min])
-        upper_bg = np.array([b_h_max, b_s_max, b_v_max])
-        
-        # Máscaras
-        skin_mask = cv2.inRange(hsv, lower_skin, upper_skin)
-        bg_mask = cv2.inRange(hsv, lower_bg, upper_bg)
-        
-        # Combinación: Piel AND NOT Fondo
-        not_bg = cv2.bitwise_not(bg_mask)
-        final_mask = cv2.bitwise_and(skin_mask, not_bg)
-        
-        # Visualización
-        scale = 0.5
-        h, w = frame.shape[:2]
-        small_frame = cv2.resize(frame, (0,0), fx=scale, fy=scale)
-        small_skin = cv2.cvtColor(cv2.resize(skin_mask, (0,0), fx=scale, fy=scale), cv2.COLOR_GRAY2BGR)
-        small_bg = cv2.cvtColor(cv2.resize(bg_mask, (0,0), fx=scale, fy=scale), cv2.COLOR_GRAY2BGR)
-        small_final = cv2.cvtColor(cv2.resize(final_mask, (0,0), fx=scale, fy=scale), cv2.COLOR_GRAY2BGR)
-        
-        cv2.putText(small_skin, "1. SKIN MASK (Busca blanco en mano)", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-        cv2.putText(small_bg, "2. BG MASK (Busca blanco en fondo)", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-        cv2.putText(small_final, "3. RESULTADO (Mano blanca, fondo negro)", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
-        
-        top_row = np.hstack((small_frame, small_final))
-        bottom_row = np.hstack((small_skin, small_bg))
-        collage = np.vstack((top_row, bottom_row))
-        
-        cv2.imshow('Calibrador', collage)
+        cv2.imshow('Calibrador', tuner.render())
         
         key = cv2.waitKey(1) & 0xFF
         if key == ord('q'):
             break
+        elif key == ord('p'):
+            paused = not paused
         elif key == ord('s'):
-            save_config(lower_skin, upper_skin, lower_bg, upper_bg)
+            save_config(*tuner.bounds('skin'), *tuner.bounds('bg'),
+                        skin_hist=fit['skin_hist'] if fit is not None else None)
             break
             
     cap.release()
     cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Calibrador de umbrales HSV de piel y fondo.')
+    parser.add_argument('--source', type=str, default='0', help='Índice de cámara, vídeo o directorio de imágenes')
+    parser.add_argument('--auto', action='store_true',
+                        help='Ajustar los umbrales a partir de muestras de fondo y de la mano antes de abrir los sliders')
+    args = parser.parse_args()
+
+    main(args.source, auto=args.auto)
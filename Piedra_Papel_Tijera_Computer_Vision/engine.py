@@ -0,0 +1,874 @@
+import argparse
+import os
+import random
+import time
+import cv2
+from concurrent.futures import ThreadPoolExecutor
+
+from background_model import BackgroundModel, BACKGROUND_METHODS
+from ball_tracker import BallTracker
+from frame_pipeline import FramePipeline
+from frame_source import open_source
+from lens_correction import LensCorrector
+from profiling import profiler
+from temporal_voting import GestureVoter
+from ui import (COLORS_BGR, UI_BACKGROUND, UI_PRIMARY, UI_ACCENT, UI_SUCCESS, UI_WARNING,
+                UI_TEXT_PRIMARY, UI_TEXT_SECONDARY, UI_PLAYER1, UI_PLAYER2,
+                draw_rounded_rectangle, draw_text_with_background, draw_text_with_outline,
+                draw_progress_circle, draw_translucent_panel, static_layers, text_size, text_cache)
+from vision import classify_gesture, draw_gesture_overlay, detect_color_ball_pyramid, SKIN_BACKENDS
+
+# Secuencias Objetivo
+TARGET_PVP = ["Rojo", "Amarillo", "Azul"]
+TARGET_CPU = ["Azul", "Amarillo", "Rojo"]
+
+# Estados Globales del Sistema
+STATE_MENU = "MENU"
+STATE_GAME_PVP = "GAME_PVP"
+STATE_GAME_PVE = "GAME_PVE"
+
+# Estados Internos del Juego
+# Sin chroma key, la partida empieza aprendiendo el fondo de las cajas vacías:
+# GAME_CLEAR pide retirar las manos y GAME_LEARNING aprende tras confirmar con ESPACIO
+GAME_CLEAR = "CLEAR"
+GAME_LEARNING = "LEARNING"
+GAME_WAITING = "WAITING"
+GAME_COUNTDOWN = "COUNTDOWN"
+GAME_CAPTURE = "CAPTURE"
+GAME_RESULT = "RESULT"
+
+# Captura final: se vota el gesto alrededor de "¡YA!" + FINAL_CAPTURE_DELAY segundos
+FINAL_CAPTURE_DELAY = 0.4
+FINAL_CAPTURE_TIMEOUT = 1.0  # Si la cámara no entrega frames, se decide con lo que haya
+FINAL_VOTE_FRAMES = 7  # Detecciones alrededor del instante de captura que votan el gesto final
+
+# Menú: la bola se busca a 1/2**nivel de resolución y se confirma a resolución
+# completa (0 = frame entero, 2 = 1/4, 3 = 1/8)
+MENU_PYRAMID_LEVEL = 2
+
+# Paso de la escala del pulso de la cuenta regresiva (tamaños distintos por número)
+COUNTDOWN_SCALE_STEP = 0.05
+
+# Teclas
+KEY_SPACE = 32
+KEY_REMATCH = ord('r')
+KEY_MENU = ord('m')
+
+
+def determine_winner(p1, p2):
+    """Lógica del juego Piedra, Papel, Tijera."""
+    if p1 == "..." or p2 == "...": return "Gesto Invalido", (128, 128, 128)
+    if p1 == p2: return "EMPATE", (255, 255, 0)
+
+    wins = {"Piedra": "Tijera", "Papel": "Piedra", "Tijera": "Papel"}
+
+    if wins.get(p1) == p2:
+        return "GANA JUGADOR 1", (0, 255, 0) # Verde
+    else:
+        return "GANA JUGADOR 2", (0, 255, 255) # Amarillo/Cian para J2
+
+def new_menu_vars():
+    """Variables persistentes para el menú."""
+    return {
+        'sequence': [],
+        'last_detected_color': None,
+        'detection_frames': 0
+    }
+
+def new_game_vars():
+    """Variables persistentes para el juego (se reinician al entrar)."""
+    return {
+        'state': GAME_WAITING,
+        'start_time': 0,
+        'last_beep': 4,
+        'p1_final': "...",
+        'p2_final': "...",
+        'go_time': 0,
+        'capture_target': 0,
+        'voter_p1': GestureVoter(),
+        'voter_p2': GestureVoter(),
+        'result_text': "",
+        'result_color': (255, 255, 255)
+    }
+
+def game_rois(width, height):
+    """Cajas (x1, y1, x2, y2) de cada jugador para un tamaño de frame."""
+    box_width = int(width * 0.45)
+    box_height = int(height * 0.6)
+    margin_top = int(height * 0.15)
+
+    # P1 (Izquierda - Humano)
+    r1 = (20, margin_top, 20 + box_width, margin_top + box_height)
+
+    # P2 (Derecha - Humano o CPU)
+    r2 = (width - 20 - box_width, margin_top, width - 20, margin_top + box_height)
+    return r1, r2
+
+# Vistas: cada pantalla tiene una parte de lógica (update_*) y otra de dibujo (draw_*)
+
+def update_menu(frame, state_vars, pyramid_level=MENU_PYRAMID_LEVEL, tracker=None, scratch=None):
+    """
+    Lógica del MENU PRINCIPAL (Selector de Bolas). Devuelve los datos que necesita el dibujo.
+    `scratch` son los buffers de trabajo de la detección (FramePipeline).
+    """
+    # Detección (blur + HSV incluidos): con tracker solo alrededor de la última
+    # bola; si no, primero sobre el frame reducido
+    if tracker is not None:
+        color, contour = tracker.detect(frame, scratch)
+    else:
+        color, contour = detect_color_ball_pyramid(frame, pyramid_level, scratch=scratch)
+
+    # Lógica de estabilidad
+    if color:
+        if color == state_vars['last_detected_color']:
+            state_vars['detection_frames'] += 1
+        else:
+            state_vars['detection_frames'] = 0
+            state_vars['last_detected_color'] = color
+
+        if state_vars['detection_frames'] > 15: # REQUIRED_FRAMES
+            if not state_vars['sequence'] or state_vars['sequence'][-1] != color:
+                state_vars['sequence'].append(color)
+                state_vars['detection_frames'] = 0
+                if len(state_vars['sequence']) > 3:
+                    state_vars['sequence'].pop(0)
+    else:
+        state_vars['detection_frames'] = 0
+        state_vars['last_detected_color'] = None
+
+    # Comprobar activación de modos y devolver el posible siguiente estado
+    next_global_state = STATE_MENU
+    if state_vars['sequence'] == TARGET_PVP:
+        next_global_state = STATE_GAME_PVP
+    elif state_vars['sequence'] == TARGET_CPU:
+        next_global_state = STATE_GAME_PVE
+
+    return {'color': color, 'contour': contour, 'next_state': next_global_state}
+
+def draw_menu_static(frame):
+    """Parte fija del MENU PRINCIPAL: título, combos de colores y rótulo de la secuencia."""
+    height, width, _ = frame.shape
+
+    # Título principal con efecto de sombra
+    title = "PIEDRA, PAPEL O TIJERA"
+    title_font_scale = 1.5
+    title_size = text_size(title, cv2.FONT_HERSHEY_DUPLEX, title_font_scale, 4)[0]
+    title_x = int((width - title_size[0]) / 2)
+    title_y = 80
+
+    # Sombra del título
+    draw_text_with_outline(frame, title, (title_x, title_y),
+                          font=cv2.FONT_HERSHEY_DUPLEX, font_scale=title_font_scale,
+                          text_color=UI_ACCENT, outline_color=(0, 0, 0),
+                          thickness=4, outline_thickness=8)
+
+    # Subtítulo
+    subtitle = "Selecciona el modo de juego con las bolas de colores"
+    subtitle_size = text_size(subtitle, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0]
+    subtitle_x = int((width - subtitle_size[0]) / 2)
+    draw_text_with_outline(frame, subtitle, (subtitle_x, title_y + 50),
+                          font_scale=0.7, text_color=UI_TEXT_SECONDARY,
+                          outline_color=(0, 0, 0), thickness=2)
+
+    # Panel de instrucciones (esquina superior derecha)
+    panel_x = width - 350
+    panel_y = 40
+    draw_text_with_background(frame, "COMBOS DE COLORES:", (panel_x, panel_y + 25),
+                            font_scale=0.7, text_color=UI_TEXT_PRIMARY,
+                            bg_color=UI_BACKGROUND, thickness=2, padding=12, alpha=0.85)
+
+    # Mostrar combos con círculos de colores
+    combo_y = panel_y + 65
+    # Combo PvP
+    for i, c in enumerate(["Rojo", "Amarillo", "Azul"]):
+        cv2.circle(frame, (panel_x + 20 + i*35, combo_y), 12, COLORS_BGR[c], -1)
+        cv2.circle(frame, (panel_x + 20 + i*35, combo_y), 14, UI_TEXT_PRIMARY, 2)
+    draw_text_with_outline(frame, "-> Jugador vs Jugador", (panel_x + 125, combo_y + 5),
+                          font_scale=0.6, text_color=UI_SUCCESS, thickness=1)
+
+    # Combo PvE
+    combo_y += 40
+    for i, c in enumerate(["Azul", "Amarillo", "Rojo"]):
+        cv2.circle(frame, (panel_x + 20 + i*35, combo_y), 12, COLORS_BGR[c], -1)
+        cv2.circle(frame, (panel_x + 20 + i*35, combo_y), 14, UI_TEXT_PRIMARY, 2)
+    draw_text_with_outline(frame, "-> Jugador vs CPU", (panel_x + 125, combo_y + 5),
+                          font_scale=0.6, text_color=UI_WARNING, thickness=1)
+
+    # Indicador de secuencia actual (parte inferior central)
+    seq_label = "SECUENCIA ACTUAL:"
+    seq_label_size = text_size(seq_label, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)[0]
+    seq_label_x = int((width - seq_label_size[0]) / 2)
+
+    draw_text_with_outline(frame, seq_label, (seq_label_x, height - 150),
+                          font_scale=0.8, text_color=UI_TEXT_PRIMARY,
+                          outline_color=(0, 0, 0), thickness=2)
+
+def draw_game_static(frame, mode):
+    """Parte fija de la partida: cajas y etiquetas de los jugadores."""
+    height, width, _ = frame.shape
+    r1, r2 = game_rois(width, height)
+    box_width = r1[2] - r1[0]
+
+    # Caja Jugador 1 con esquinas redondeadas
+    draw_rounded_rectangle(frame, (r1[0], r1[1]), (r1[2], r1[3]), UI_PLAYER1, thickness=5, radius=20)
+
+    # Etiqueta Jugador 1 con fondo
+    label_p1 = "JUGADOR 1"
+    label_p1_size = text_size(label_p1, cv2.FONT_HERSHEY_DUPLEX, 1, 3)[0]
+    label_p1_x = r1[0] + (box_width - label_p1_size[0]) // 2
+    draw_text_with_background(frame, label_p1, (label_p1_x, r1[1] - 25),
+                            font=cv2.FONT_HERSHEY_DUPLEX, font_scale=1,
+                            text_color=UI_TEXT_PRIMARY, bg_color=UI_PLAYER1,
+                            thickness=3, padding=15, alpha=0.9)
+
+    # Caja Jugador 2 con esquinas redondeadas
+    draw_rounded_rectangle(frame, (r2[0], r2[1]), (r2[2], r2[3]), UI_PLAYER2, thickness=5, radius=20)
+
+    # Etiqueta Jugador 2 con fondo
+    name_p2 = "JUGADOR 2" if mode == STATE_GAME_PVP else "CPU"
+    label_p2_size = text_size(name_p2, cv2.FONT_HERSHEY_DUPLEX, 1, 3)[0]
+    label_p2_x = r2[0] + (box_width - label_p2_size[0]) // 2
+    draw_text_with_background(frame, name_p2, (label_p2_x, r2[1] - 25),
+                            font=cv2.FONT_HERSHEY_DUPLEX, font_scale=1,
+                            text_color=UI_TEXT_PRIMARY, bg_color=UI_PLAYER2,
+                            thickness=3, padding=15, alpha=0.9)
+
+def draw_waiting_static(frame):
+    """Instrucciones fijas de la espera antes de la cuenta regresiva."""
+    height, width, _ = frame.shape
+
+    # Instrucción central
+    text = "Prepara tu gesto"
+    prompt_size = text_size(text, cv2.FONT_HERSHEY_SIMPLEX, 1.2, 3)[0]
+    text_x = int((width - prompt_size[0]) / 2)
+    draw_text_with_outline(frame, text, (text_x, height - 120),
+                          font_scale=1.2, text_color=UI_TEXT_PRIMARY,
+                          outline_color=(0, 0, 0), thickness=3)
+
+    # Botón de inicio
+    start_text = "Presiona ESPACIO para comenzar"
+    start_size = text_size(start_text, cv2.FONT_HERSHEY_SIMPLEX, 0.9, 2)[0]
+    start_x = int((width - start_size[0]) / 2)
+    draw_text_with_background(frame, start_text, (start_x, height - 60),
+                            font_scale=0.9, text_color=UI_TEXT_PRIMARY,
+                            bg_color=UI_SUCCESS, thickness=2, padding=15, alpha=0.85)
+
+def draw_clear_static(frame, learning):
+    """Instrucciones fijas mientras se aprende el fondo de las cajas."""
+    height, width, _ = frame.shape
+
+    # Instrucción central
+    text = "Aprendiendo el fondo..." if learning else "RETIRA LAS MANOS"
+    prompt_size = text_size(text, cv2.FONT_HERSHEY_SIMPLEX, 1.2, 3)[0]
+    text_x = int((width - prompt_size[0]) / 2)
+    draw_text_with_outline(frame, text, (text_x, height - 120),
+                          font_scale=1.2, text_color=UI_WARNING,
+                          outline_color=(0, 0, 0), thickness=3)
+
+    if learning:
+        return
+
+    # Confirmación con las cajas vacías
+    start_text = "ESPACIO con las cajas vacias"
+    start_size = text_size(start_text, cv2.FONT_HERSHEY_SIMPLEX, 0.9, 2)[0]
+    start_x = int((width - start_size[0]) / 2)
+    draw_text_with_background(frame, start_text, (start_x, height - 60),
+                            font_scale=0.9, text_color=UI_TEXT_PRIMARY,
+                            bg_color=UI_WARNING, thickness=2, padding=15, alpha=0.85)
+
+def draw_result_static(frame):
+    """Instrucciones fijas de la pantalla de resultado."""
+    height, width, _ = frame.shape
+
+    # Instrucciones en la parte inferior
+    instructions = "Presiona 'R' para REVANCHA  |  'M' para MENU"
+    instr_size = text_size(instructions, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)[0]
+    instr_x = int((width - instr_size[0]) / 2)
+    draw_text_with_background(frame, instructions, (instr_x, height - 50),
+                            font_scale=0.8, text_color=UI_TEXT_PRIMARY,
+                            bg_color=UI_BACKGROUND, thickness=2, padding=12, alpha=0.85)
+
+def draw_menu(frame, state_vars, view):
+    """Renderizado del MENU PRINCIPAL."""
+    height, width, _ = frame.shape
+    color = view['color']
+    contour = view['contour']
+
+    if color:
+        # Dibujar contorno con efecto de brillo
+        cv2.drawContours(frame, [contour], -1, COLORS_BGR[color], 5)
+        cv2.drawContours(frame, [contour], -1, UI_TEXT_PRIMARY, 2)
+
+        # Mostrar detección actual con fondo
+        draw_text_with_background(frame, f"Detectando: {color}", (20, 60),
+                                 font_scale=0.9, text_color=UI_TEXT_PRIMARY,
+                                 bg_color=COLORS_BGR[color], thickness=2, padding=15, alpha=0.8)
+
+    # Parte fija del menú (capa cacheada)
+    static_layers.draw(frame, "menu", draw_menu_static)
+
+    # Dibujar slots de secuencia (3 círculos)
+    slot_y = height - 90
+    slot_start_x = int(width / 2) - 100
+    slot_spacing = 70
+
+    for i in range(3):
+        slot_x = slot_start_x + (i * slot_spacing)
+
+        if i < len(state_vars['sequence']):
+            # Círculo lleno con el color detectado
+            color_name = state_vars['sequence'][i]
+            # Efecto de brillo (círculo exterior)
+            cv2.circle(frame, (slot_x, slot_y), 32, COLORS_BGR[color_name], 3)
+            cv2.circle(frame, (slot_x, slot_y), 26, COLORS_BGR[color_name], -1)
+            cv2.circle(frame, (slot_x, slot_y), 28, UI_TEXT_PRIMARY, 2)
+        else:
+            # Slot vacío
+            cv2.circle(frame, (slot_x, slot_y), 26, (60, 60, 60), -1)
+            cv2.circle(frame, (slot_x, slot_y), 28, UI_TEXT_SECONDARY, 2)
+            # Número de slot
+            num_text = str(i + 1)
+            num_size = text_size(num_text, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0]
+            text_cache.draw(frame, num_text, (slot_x - num_size[0]//2, slot_y + num_size[1]//2),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, UI_TEXT_SECONDARY, 2)
+
+    mode_text = ""
+    mode_color = UI_SUCCESS
+    if view['next_state'] == STATE_GAME_PVP:
+        mode_text = "JUGADOR VS JUGADOR"
+        mode_color = UI_SUCCESS
+    elif view['next_state'] == STATE_GAME_PVE:
+        mode_text = "JUGADOR VS CPU"
+        mode_color = UI_WARNING
+
+    if mode_text:
+        # Panel de confirmación de modo (centro de la pantalla)
+        panel_width = 600
+        panel_height = 180
+        panel_left = int((width - panel_width) / 2)
+        panel_top = int((height - panel_height) / 2)
+
+        # Fondo semitransparente
+        draw_translucent_panel(frame, (panel_left, panel_top),
+                               (panel_left + panel_width, panel_top + panel_height),
+                               UI_BACKGROUND, 0.92, radius=30, beta=0.08)
+
+        # Borde del panel con el color del modo
+        draw_rounded_rectangle(frame, (panel_left, panel_top),
+                             (panel_left + panel_width, panel_top + panel_height),
+                             mode_color, thickness=4, radius=30)
+
+        # Título del modo
+        mode_title = "MODO SELECCIONADO"
+        mode_title_size = text_size(mode_title, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0]
+        mode_title_x = int((width - mode_title_size[0]) / 2)
+        draw_text_with_outline(frame, mode_title, (mode_title_x, panel_top + 45),
+                              font_scale=0.7, text_color=UI_TEXT_SECONDARY,
+                              outline_color=(0, 0, 0), thickness=2)
+
+        # Nombre del modo (grande y destacado)
+        mode_size = text_size(mode_text, cv2.FONT_HERSHEY_DUPLEX, 1.2, 3)[0]
+        mode_x = int((width - mode_size[0]) / 2)
+        draw_text_with_outline(frame, mode_text, (mode_x, panel_top + 95),
+                              font=cv2.FONT_HERSHEY_DUPLEX, font_scale=1.2,
+                              text_color=mode_color, outline_color=(0, 0, 0),
+                              thickness=3, outline_thickness=6)
+
+        # Instrucción para confirmar
+        confirm_text = "Pulsa 'ESPACIO' para CONFIRMAR"
+        confirm_size = text_size(confirm_text, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)[0]
+        confirm_x = int((width - confirm_size[0]) / 2)
+        draw_text_with_outline(frame, confirm_text, (confirm_x, panel_top + 145),
+                              font_scale=0.8, text_color=UI_ACCENT,
+                              outline_color=(0, 0, 0), thickness=2)
+
+
+def classify_rois(rois, executor=None, skin_backend="box", foregrounds=None, scratches=None):
+    """
+    Clasifica cada ROI con classify_gesture (segmentando la piel con
+    `skin_backend` y, si se dan, con la máscara de `foregrounds` de cada ROI en
+    lugar del chroma key) y devuelve los resultados en orden. `scratches` son
+    los buffers de trabajo de cada ROI (FramePipeline.rois).
+
+    Con `executor` se lanzan en paralelo (OpenCV libera el GIL); sin él, en
+    serie. El resultado es el mismo en ambos modos: la clasificación no
+    escribe en las ROIs.
+    """
+    foregrounds = foregrounds or [None] * len(rois)
+    scratches = scratches or [None] * len(rois)
+    jobs = zip(rois, foregrounds, scratches)
+    if executor is None or len(rois) < 2:
+        return [classify_gesture(roi, skin_backend, fg, scratch) for roi, fg, scratch in jobs]
+    futures = [executor.submit(classify_gesture, roi, skin_backend, fg, scratch) for roi, fg, scratch in jobs]
+    return [f.result() for f in futures]
+
+def update_game(frame, mode, game_vars, now, frame_time=None, events=None, roi_executor=None,
+                skin_backend="box", backgrounds=None, scratches=None):
+    """
+    Lógica compartida para PvP y PvE: detección en tiempo real y máquina de estados.
+
+    `now` es el reloj del juego (time.monotonic en vivo, marca del frame en vídeo grabado):
+    la cuenta atrás y el tiempo límite de la captura avanzan con él aunque la cámara
+    se detenga. `frame_time` es la marca del frame, con la que se vota el gesto final.
+    Los sonidos no se reproducen aquí: se añaden a `events` como ('sound', freq, duración).
+    `backgrounds` son los modelos de fondo de cada ROI si no se usa el chroma key:
+    solo aprenden en GAME_LEARNING, con las cajas vacías, y después quedan congelados.
+    `scratches` son los buffers de trabajo de cada ROI (FramePipeline.rois).
+    """
+    height, width, _ = frame.shape
+    r1, r2 = game_rois(width, height)
+    events = [] if events is None else events
+    frame_time = now if frame_time is None else frame_time
+
+    # Detección en Tiempo Real (feedback visual y voto final)
+    # En PvP las dos ROIs se clasifican a la vez si hay roi_executor; los
+    # resultados se recogen antes de la máquina de estados.
+    rois = [frame[r1[1]:r1[3], r1[0]:r1[2]]]
+    if mode == STATE_GAME_PVP:
+        rois.append(frame[r2[1]:r2[3], r2[0]:r2[2]])
+    foregrounds = None
+    if backgrounds is not None:
+        with profiler.span("background"):
+            learn = game_vars['state'] == GAME_LEARNING
+            foregrounds = [model.apply(roi, learn, scratch)
+                           for model, roi, scratch in zip(backgrounds, rois, scratches or [None] * len(rois))]
+    with profiler.span("rois"):
+        results = classify_rois(rois, roi_executor, skin_backend, foregrounds, scratches)
+
+    # Cada detección se guarda con la marca de tiempo de su frame para el voto final
+    current_p1 = results[0]['gesture']
+    game_vars['voter_p1'].add(frame_time, current_p1, results[0]['confidence'])
+
+    current_p2 = "..."
+    if mode == STATE_GAME_PVP:
+        current_p2 = results[1]['gesture']
+        game_vars['voter_p2'].add(frame_time, current_p2, results[1]['confidence'])
+    else:
+        current_p2 = "Pensando..." if game_vars['state'] not in (GAME_CLEAR, GAME_LEARNING, GAME_WAITING) else "..."
+
+    view = {'r1': r1, 'r2': r2, 'current_p1': current_p1, 'current_p2': current_p2, 'elapsed': 0.0,
+            'results': results}
+
+    # ==================== MÁQUINA DE ESTADOS DEL JUEGO ====================
+
+    # Fondo aprendido en todas las cajas en uso: ya se puede empezar
+    if game_vars['state'] == GAME_LEARNING and all(model.ready for model in backgrounds[:len(rois)]):
+        game_vars['state'] = GAME_WAITING
+
+    if game_vars['state'] == GAME_COUNTDOWN:
+        elapsed = now - game_vars['start_time']
+        timer = 3 - int(elapsed)
+        view['elapsed'] = elapsed
+
+        # Sonido
+        if timer < game_vars['last_beep'] and timer > 0:
+            events.append(('sound', 1000, 200))
+            game_vars['last_beep'] = timer
+
+        if timer <= 0:
+            # FINISH: se fija el instante del "¡YA!" y el de la captura final
+            events.append(('sound', 2000, 400))
+            game_vars['go_time'] = game_vars['start_time'] + 3
+            game_vars['capture_target'] = game_vars['go_time'] + FINAL_CAPTURE_DELAY
+            game_vars['state'] = GAME_CAPTURE
+
+    # Estado a dibujar en este frame: el mismo frame en que termina la cuenta ya
+    # muestra el "¡YA!", y el banner de resultado aparece a partir del siguiente
+    view['state'] = game_vars['state']
+
+    if game_vars['state'] == GAME_CAPTURE:
+        # Captura Final: voto ponderado entre los FINAL_VOTE_FRAMES detecciones más
+        # cercanas a T+400ms, en cuanto haya suficientes frames posteriores a ese instante.
+        # El frame actual ya está en el voto, así que nunca falta una detección.
+        target = game_vars['capture_target']
+        decided = None
+        enough = game_vars['voter_p1'].count_after(target) > FINAL_VOTE_FRAMES // 2
+        if enough or now > target + FINAL_CAPTURE_TIMEOUT:
+            p1, _ = game_vars['voter_p1'].vote(target, FINAL_VOTE_FRAMES)
+            if mode == STATE_GAME_PVP:
+                p2, _ = game_vars['voter_p2'].vote(target, FINAL_VOTE_FRAMES)
+            else:
+                # Modo CPU: Capturamos P1 y generamos P2
+                p2 = random.choice(["Piedra", "Papel", "Tijera"])
+            decided = (p1, p2)
+
+        if decided is not None:
+            game_vars['p1_final'], game_vars['p2_final'] = decided
+
+            # Calcular ganador
+            res_text, res_color = determine_winner(game_vars['p1_final'], game_vars['p2_final'])
+            game_vars['result_text'] = res_text
+            game_vars['result_color'] = res_color
+
+            # Sonido Final
+            if "1" in res_text: events.append(('sound', 500, 600))
+            elif "2" in res_text or "CPU" in res_text: events.append(('sound', 1500, 600))
+            else: events.append(('sound', 300, 300))
+
+            game_vars['state'] = GAME_RESULT
+
+    return view
+
+def draw_game(frame, mode, game_vars, view):
+    """Renderizado compartido para PvP y PvE."""
+    height, width, _ = frame.shape
+    r1, r2 = view['r1'], view['r2']
+    current_p1 = view['current_p1']
+    current_p2 = view['current_p2']
+
+    # Contorno y huecos entre dedos de cada mano detectada
+    for (x1, y1, x2, y2), result in zip((r1, r2), view['results']):
+        draw_gesture_overlay(frame[y1:y2, x1:x2], result)
+
+    # Cajas y etiquetas de los jugadores (capa fija por modo)
+    static_layers.draw(frame, ("game", mode), lambda canvas: draw_game_static(canvas, mode))
+
+    state = view['state']
+
+    if state in (GAME_CLEAR, GAME_LEARNING):
+        # Instrucciones para aprender el fondo (capa fija por estado)
+        learning = state == GAME_LEARNING
+        static_layers.draw(frame, ("game_clear", learning), lambda canvas: draw_clear_static(canvas, learning))
+
+    elif state == GAME_WAITING:
+        # Instrucciones y botón de inicio (capa fija)
+        static_layers.draw(frame, "game_waiting", draw_waiting_static)
+
+        # Mostrar gesto actual detectado con icono
+        gesture_p1_y = r1[3] + 70
+        draw_text_with_outline(frame, current_p1, (r1[0] + 20, gesture_p1_y),
+                              font=cv2.FONT_HERSHEY_DUPLEX, font_scale=1.8,
+                              text_color=UI_PLAYER1, outline_color=(0, 0, 0),
+                              thickness=4, outline_thickness=7)
+
+        if mode == STATE_GAME_PVP:
+            gesture_p2_y = r2[3] + 70
+            draw_text_with_outline(frame, current_p2, (r2[0] + 20, gesture_p2_y),
+                                  font=cv2.FONT_HERSHEY_DUPLEX, font_scale=1.8,
+                                  text_color=UI_PLAYER2, outline_color=(0, 0, 0),
+                                  thickness=4, outline_thickness=7)
+
+    elif state == GAME_COUNTDOWN:
+        elapsed = view['elapsed']
+        timer = 3 - int(elapsed)
+
+        # Cuenta regresiva con círculo de progreso
+        countdown_center = (int(width / 2), int(height / 2))
+        countdown_radius = 120
+
+        # Progreso (0 a 3 segundos -> 1.0 a 0.0)
+        progress = 1.0 - (elapsed / 3.0)
+
+        # Círculo de progreso
+        draw_progress_circle(frame, countdown_center, countdown_radius, progress, UI_ACCENT, thickness=15)
+
+        # Número de cuenta regresiva con efecto dramático
+        timer_str = str(timer)
+        # Tamaño de fuente con escala dinámica (pulso)
+        scale_factor = 1.0 + (0.3 * (1.0 - (elapsed % 1.0)))  # Pulso cada segundo
+        # Escala cuantizada: cada tamaño del número se rasteriza una sola vez
+        scale_factor = round(scale_factor / COUNTDOWN_SCALE_STEP) * COUNTDOWN_SCALE_STEP
+        font_scale = 8 * scale_factor
+        timer_size = text_size(timer_str, cv2.FONT_HERSHEY_DUPLEX, font_scale, int(15 * scale_factor))[0]
+        timer_x = countdown_center[0] - timer_size[0] // 2
+        timer_y = countdown_center[1] + timer_size[1] // 2
+
+        draw_text_with_outline(frame, timer_str, (timer_x, timer_y),
+                              font=cv2.FONT_HERSHEY_DUPLEX, font_scale=font_scale,
+                              text_color=UI_ACCENT, outline_color=(0, 0, 0),
+                              thickness=int(10 * scale_factor), outline_thickness=int(15 * scale_factor))
+
+        # Feedback visual continuo de gestos (pequeño)
+        draw_text_with_outline(frame, current_p1, (r1[0] + 20, r1[3] + 70),
+                              font=cv2.FONT_HERSHEY_DUPLEX, font_scale=1.5,
+                              text_color=UI_PLAYER1, outline_color=(0, 0, 0),
+                              thickness=3, outline_thickness=6)
+        if mode == STATE_GAME_PVP:
+            draw_text_with_outline(frame, current_p2, (r2[0] + 20, r2[3] + 70),
+                                  font=cv2.FONT_HERSHEY_DUPLEX, font_scale=1.5,
+                                  text_color=UI_PLAYER2, outline_color=(0, 0, 0),
+                                  thickness=3, outline_thickness=6)
+
+    elif state == GAME_CAPTURE:
+        finish_text = "¡YA!"
+        finish_size = text_size(finish_text, cv2.FONT_HERSHEY_DUPLEX, 6, 15)[0]
+        finish_x = int((width - finish_size[0]) / 2)
+        finish_y = int(height / 2)
+        draw_text_with_outline(frame, finish_text, (finish_x, finish_y),
+                              font=cv2.FONT_HERSHEY_DUPLEX, font_scale=6,
+                              text_color=UI_SUCCESS, outline_color=(0, 0, 0),
+                              thickness=15, outline_thickness=20)
+
+    elif state == GAME_RESULT:
+        # ==================== PANTALLA DE RESULTADOS ====================
+
+        # Mostrar gestos finales con estilo
+        gesture_p1_y = r1[3] + 70
+        draw_text_with_outline(frame, game_vars['p1_final'], (r1[0] + 20, gesture_p1_y),
+                              font=cv2.FONT_HERSHEY_DUPLEX, font_scale=2,
+                              text_color=UI_PLAYER1, outline_color=(0, 0, 0),
+                              thickness=5, outline_thickness=8)
+
+        gesture_p2_y = r2[3] + 70
+        draw_text_with_outline(frame, game_vars['p2_final'], (r2[0] + 20, gesture_p2_y),
+                              font=cv2.FONT_HERSHEY_DUPLEX, font_scale=2,
+                              text_color=UI_PLAYER2, outline_color=(0, 0, 0),
+                              thickness=5, outline_thickness=8)
+
+        # Banner de resultado (centro superior)
+        banner_width = 700
+        banner_height = 160
+        banner_left = int((width - banner_width) / 2)
+        banner_top = 60
+
+        # Determinar color del banner según resultado
+        if "1" in game_vars['result_text']:
+            banner_color = UI_PLAYER1
+        elif "2" in game_vars['result_text'] or "CPU" in game_vars['result_text']:
+            banner_color = UI_PLAYER2
+        else:  # Empate
+            banner_color = UI_ACCENT
+
+        # Fondo semitransparente para el banner
+        draw_translucent_panel(frame, (banner_left, banner_top),
+                               (banner_left + banner_width, banner_top + banner_height),
+                               UI_BACKGROUND, 0.9, radius=30, beta=0.1)
+
+        # Borde del banner con color del ganador
+        draw_rounded_rectangle(frame, (banner_left, banner_top),
+                             (banner_left + banner_width, banner_top + banner_height),
+                             banner_color, thickness=6, radius=30)
+
+        # Texto "RESULTADO"
+        result_label = "RESULTADO"
+        result_label_size = text_size(result_label, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)[0]
+        result_label_x = int((width - result_label_size[0]) / 2)
+        draw_text_with_outline(frame, result_label, (result_label_x, banner_top + 45),
+                              font_scale=0.8, text_color=UI_TEXT_SECONDARY,
+                              outline_color=(0, 0, 0), thickness=2)
+
+        # Texto del ganador (grande y destacado)
+        winner_size = text_size(game_vars['result_text'], cv2.FONT_HERSHEY_DUPLEX, 2, 5)[0]
+        winner_x = int((width - winner_size[0]) / 2)
+        draw_text_with_outline(frame, game_vars['result_text'], (winner_x, banner_top + 110),
+                              font=cv2.FONT_HERSHEY_DUPLEX, font_scale=2,
+                              text_color=banner_color, outline_color=(0, 0, 0),
+                              thickness=5, outline_thickness=9)
+
+        # Efectos de confeti simple (puntos aleatorios) para el ganador
+        if "GANA" in game_vars['result_text']:
+            for _ in range(30):
+                x = random.randint(0, width)
+                y = random.randint(0, height // 3)
+                color_choice = random.choice([UI_ACCENT, UI_SUCCESS, UI_WARNING, UI_PRIMARY])
+                cv2.circle(frame, (x, y), random.randint(3, 8), color_choice, -1)
+
+        # Instrucciones en la parte inferior (capa fija)
+        static_layers.draw(frame, "game_result", draw_result_static)
+
+
+class GameEngine:
+    """
+    Motor del juego sin ventana ni cámara: recibe frames y devuelve el estado.
+
+    step() aplica la corrección de lente y el espejo, ejecuta la pantalla activa
+    (menú o partida) y procesa la tecla pulsada. El dibujo de la interfaz es
+    opcional (`render`), de modo que el mismo motor sirve para final.py con
+    HighGUI y para ejecuciones headless sobre vídeo grabado.
+
+    Las imágenes intermedias se escriben en buffers preasignados (FramePipeline),
+    así que el frame devuelto por step() se reutiliza en la siguiente llamada.
+    """
+
+    def __init__(self, render=True, calibration_file="calibration_data.npz",
+                 parallel_rois=None,
+                 menu_pyramid_level=MENU_PYRAMID_LEVEL, menu_tracking=True, skin_backend="box",
+                 background="chroma"):
+        self.render = render
+        self.lens = LensCorrector(calibration_file)
+
+        # Clasificación de las dos ROIs en paralelo (PvP). None = automático según núcleos;
+        # False = siempre en serie (modo determinista de referencia).
+        if parallel_rois is None:
+            parallel_rois = (os.cpu_count() or 1) >= 2
+        self.roi_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="roi") if parallel_rois else None
+
+        self.menu_pyramid_level = menu_pyramid_level
+        # Seguimiento de la bola del menú (ventana alrededor de la posición prevista)
+        self.ball_tracker = BallTracker(menu_pyramid_level) if menu_tracking else None
+
+        # Segmentación de la mano: caja HSV o retroproyección (vision.SKIN_BACKENDS)
+        self.skin_backend = skin_backend
+        # Fondo: chroma key verde o un modelo aprendido por ROI (BACKGROUND_METHODS)
+        self.backgrounds = None
+        if background != "chroma":
+            self.backgrounds = [BackgroundModel(background), BackgroundModel(background)]
+
+        # Buffers de trabajo del bucle del juego
+        self.pipeline = FramePipeline()
+
+        self.global_state = STATE_MENU
+        self.menu_vars = new_menu_vars()
+        self.game_vars = new_game_vars()
+
+    def close(self):
+        """Libera los hilos de clasificación."""
+        if self.roi_executor is not None:
+            self.roi_executor.shutdown(wait=True)
+            self.roi_executor = None
+
+    def preprocess(self, frame):
+        """
+        Corrección de distorsión (con recorte) y efecto espejo, escritas en el
+        buffer "frame" del pipeline del juego.
+        """
+        pipeline = self.pipeline
+        height, width = frame.shape[:2]
+        out_width, out_height = self.lens.output_size(width, height)
+        dst = pipeline.get("frame", (out_height, out_width) + frame.shape[2:])
+        if self.lens.enabled:
+            # El espejo va incluido en los mapas de remap: una sola pasada
+            with profiler.span("undistort"):
+                return self.lens.apply(frame, mirror=True, dst=dst)
+        with profiler.span("flip"):
+            return cv2.flip(frame, 1, dst=dst)
+
+    def step(self, raw_frame, timestamp=None, key=-1, wall_time=None):
+        """
+        Procesa un frame de cámara (sin corregir) y la tecla pulsada en él.
+
+        `timestamp` es la marca de tiempo del frame en segundos; si es None se usa
+        time.monotonic(). `wall_time` es el reloj del juego (cuenta atrás y tiempo
+        límite de la captura); si es None se usa `timestamp`, como en vídeo grabado.
+        En vivo deben ser relojes distintos con la misma base (ThreadedCapture marca
+        los frames con time.monotonic): si la cámara se bloquea y repite el último
+        frame, su marca no avanza pero la partida sí.
+        Devuelve un diccionario con el estado resultante y el frame procesado
+        (con la interfaz dibujada si render=True).
+        """
+        frame_time = time.monotonic() if timestamp is None else timestamp
+        now = frame_time if wall_time is None else wall_time
+        frame = self.preprocess(raw_frame)
+
+        events = []
+        state = {'timestamp': frame_time, 'detected_color': None, 'p1': None, 'p2': None}
+
+        # CONTROL DE FLUJO POR ESTADOS
+        if self.global_state == STATE_MENU:
+            view = update_menu(frame, self.menu_vars, self.menu_pyramid_level, self.ball_tracker, self.pipeline)
+            if self.render:
+                with profiler.span("drawing"):
+                    draw_menu(frame, self.menu_vars, view)
+            possible_next_state = view['next_state']
+            state['detected_color'] = view['color']
+
+            # Si el menú propone un cambio de estado, esperamos confirmación
+            if possible_next_state != STATE_MENU:
+                if key == KEY_SPACE: # ESPACIO para confirmar
+                    self.global_state = possible_next_state
+                    # Resetear variables de juego
+                    self.game_vars['state'] = GAME_WAITING
+                    self.menu_vars['sequence'] = [] # Limpiar secuencia para la próxima vez
+                    if self.ball_tracker is not None:
+                        self.ball_tracker.reset()
+                    # El fondo de las ROIs se aprende de nuevo en cada partida,
+                    # después de que los jugadores retiren las manos
+                    if self.backgrounds is not None:
+                        for model in self.backgrounds:
+                            model.reset()
+                        self.game_vars['state'] = GAME_CLEAR
+
+            if key == KEY_SPACE and possible_next_state == STATE_MENU:
+                 # Si no hay secuencia completa y pulsan espacio, limpiar
+                 self.menu_vars['sequence'] = []
+
+        elif self.global_state in [STATE_GAME_PVP, STATE_GAME_PVE]:
+            game_vars = self.game_vars
+            view = update_game(frame, self.global_state, game_vars, now, frame_time,
+                               events=events,
+                               roi_executor=self.roi_executor, skin_backend=self.skin_backend,
+                               backgrounds=self.backgrounds, scratches=self.pipeline.rois)
+            if self.render:
+                with profiler.span("drawing"):
+                    draw_game(frame, self.global_state, game_vars, view)
+            state['p1'] = view['current_p1']
+            state['p2'] = view['current_p2']
+
+            if key == KEY_SPACE and game_vars['state'] == GAME_CLEAR: # ESPACIO con las cajas vacías
+                game_vars['state'] = GAME_LEARNING
+
+            elif key == KEY_SPACE and game_vars['state'] == GAME_WAITING: # ESPACIO empieza juego
+                game_vars['state'] = GAME_COUNTDOWN
+                game_vars['start_time'] = now
+                game_vars['last_beep'] = 4
+                game_vars['voter_p1'].clear()
+                game_vars['voter_p2'].clear()
+
+            elif key == KEY_REMATCH and game_vars['state'] == GAME_RESULT: # R reinicia ronda
+                game_vars['state'] = GAME_WAITING
+                game_vars['p1_final'] = "..."
+                game_vars['p2_final'] = "..."
+
+            elif key == KEY_MENU: # M vuelve al menú
+                self.global_state = STATE_MENU
+                game_vars['state'] = GAME_WAITING
+
+        state.update({
+            'screen': self.global_state,
+            'game_state': self.game_vars['state'],
+            'sequence': list(self.menu_vars['sequence']),
+            'p1_final': self.game_vars['p1_final'],
+            'p2_final': self.game_vars['p2_final'],
+            'result_text': self.game_vars['result_text'],
+            'events': events,
+            'frame': frame,
+        })
+        return state
+
+
+def parse_key_schedule(spec):
+    """Convierte "120:space,300:r" en {120: 32, 300: ord('r')} (índice de frame -> tecla)."""
+    schedule = {}
+    if not spec:
+        return schedule
+    for item in spec.split(','):
+        index, key = item.split(':')
+        schedule[int(index)] = KEY_SPACE if key == 'space' else ord(key)
+    return schedule
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Ejecuta el motor del juego sin ventana sobre una sesión grabada.')
+    parser.add_argument('source', type=str, help='Vídeo o directorio de imágenes')
+    parser.add_argument('--render', action='store_true', help='Dibujar también la interfaz')
+    parser.add_argument('--keys', type=str, default='', help='Teclas por frame, p. ej. "30:space,200:space"')
+    parser.add_argument('--menu-level', type=int, default=MENU_PYRAMID_LEVEL,
+                        help='Nivel de la pirámide del menú (0 = resolución completa)')
+    parser.add_argument('--no-tracking', action='store_true', help='Buscar la bola del menú siempre en todo el frame')
+    parser.add_argument('--skin', choices=SKIN_BACKENDS, default="box", help='Segmentación de la mano')
+    parser.add_argument('--background', choices=("chroma",) + BACKGROUND_METHODS, default="chroma",
+                        help='Chroma key verde o modelo de fondo aprendido por ROI')
+    args = parser.parse_args()
+
+    # Sin espera entre frames: el reloj del juego es el tiempo del vídeo, no el de pared
+    source = open_source(args.source, realtime=False)
+    keys = parse_key_schedule(args.keys)
+    engine = GameEngine(render=args.render, menu_pyramid_level=args.menu_level, menu_tracking=not args.no_tracking,
+                        skin_backend=args.skin, background=args.background)
+
+    index = 0
+    last = None
+    start = time.perf_counter()
+    while True:
+        ret, frame = source.read()
+        if not ret: break
+        state = engine.step(frame, timestamp=source.last_timestamp, key=keys.get(index, -1))
+        if last is None or (state['screen'], state['game_state']) != last:
+            print(f"[{index:5d}] {state['screen']} / {state['game_state']}  {state['result_text']}")
+            last = (state['screen'], state['game_state'])
+        index += 1
+    elapsed = time.perf_counter() - start
+    source.release()
+    engine.close()
+
+    print(f"{index} frames en {elapsed:.2f} s ({index / elapsed if elapsed > 0 else 0:.1f} FPS)")
@@ -0,0 +1,58 @@
+import math
+import numpy as np
+
+# ROIs de juego con scratch propio (PvP: una por jugador)
+PIPELINE_ROIS = 2
+
+
+class ScratchBuffers:
+    """
+    Buffers de trabajo reutilizables, por nombre, para escribir con dst= de OpenCV.
+
+    Cada nombre guarda un bloque de bytes que solo crece: get() devuelve una
+    vista contigua de la forma y el tipo pedidos sobre ese bloque, así que las
+    regiones de tamaño variable (ventana de seguimiento, recortes) tampoco
+    reservan memoria una vez vista la mayor. El contenido de un buffer solo es
+    válido hasta la siguiente llamada que lo use, y un mismo ScratchBuffers no
+    puede usarse desde dos hilos a la vez.
+    """
+
+    def __init__(self):
+        self._blocks = {}
+        self._views = {}  # Última vista de cada nombre: casi siempre se pide la misma forma
+
+    def get(self, name, shape, dtype=np.uint8):
+        view = self._views.get(name)
+        if view is not None and view.shape == shape and view.dtype == dtype:
+            return view
+        dtype = np.dtype(dtype)
+        nbytes = math.prod(shape) * dtype.itemsize
+        block = self._blocks.get(name)
+        if block is None or block.size < nbytes:
+            block = self._blocks[name] = np.empty(nbytes, np.uint8)
+        view = self._views[name] = block[:nbytes].view(dtype).reshape(shape)
+        return view
+
+    @property
+    def nbytes(self):
+        return sum(block.nbytes for block in self._blocks.values())
+
+
+class FramePipeline(ScratchBuffers):
+    """
+    Contexto de un bucle de frames: buffers de las etapas del frame completo
+    (corrección de lente y espejo, detección de la bola del menú) y un
+    ScratchBuffers por ROI de juego, de modo que las dos ROIs se pueden
+    clasificar en paralelo.
+
+    En régimen estacionario el pipeline no reserva memoria para las imágenes:
+    el frame devuelto por GameEngine.step es el mismo buffer en cada llamada.
+    """
+
+    def __init__(self, rois=PIPELINE_ROIS):
+        super().__init__()
+        self.rois = [ScratchBuffers() for _ in range(rois)]
+
+    @property
+    def nbytes(self):
+        return super().nbytes + sum(scratch.nbytes for scratch in self.rois)
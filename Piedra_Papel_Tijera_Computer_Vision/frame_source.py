@@ -0,0 +1,111 @@
+import glob
+import os
+import time
+import cv2
+
+IMAGE_EXTENSIONS = ('*.jpg', '*.jpeg', '*.png', '*.bmp')
+
+
+class CameraSource:
+    """Cámara en vivo. La marca de tiempo es la del reloj en el momento de la lectura."""
+
+    def __init__(self, index=0):
+        self.cap = cv2.VideoCapture(index)
+        self.last_timestamp = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        ret, frame = self.cap.read()
+        self.last_timestamp = time.monotonic() if ret else None
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class _RecordedSource:
+    """
+    Base para fuentes grabadas: la marca de tiempo es la del propio vídeo (índice / fps).
+
+    Con realtime=True se espera entre frames para reproducir a la velocidad original;
+    con realtime=False se entregan tan rápido como se pidan (benchmarks, tests).
+    """
+
+    def __init__(self, fps, realtime):
+        self.fps = fps
+        self.realtime = realtime
+        self.index = 0
+        self.last_timestamp = None
+        self._start = None
+
+    def _pace(self, timestamp):
+        if not self.realtime:
+            return
+        if self._start is None:
+            self._start = time.monotonic() - timestamp
+        delay = self._start + timestamp - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def read(self):
+        ret, frame = self._read_frame()
+        if not ret:
+            self.last_timestamp = None
+            return False, None
+        self.last_timestamp = self.index / self.fps
+        self.index += 1
+        self._pace(self.last_timestamp)
+        return True, frame
+
+
+class VideoFileSource(_RecordedSource):
+    """Archivo de vídeo."""
+
+    def __init__(self, path, realtime=False, fps=None):
+        self.cap = cv2.VideoCapture(path)
+        super().__init__(fps or self.cap.get(cv2.CAP_PROP_FPS) or 30.0, realtime)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def _read_frame(self):
+        return self.cap.read()
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageSequenceSource(_RecordedSource):
+    """Directorio de imágenes, leídas en orden alfabético."""
+
+    def __init__(self, directory, realtime=False, fps=30.0):
+        super().__init__(fps, realtime)
+        self.files = sorted(f for ext in IMAGE_EXTENSIONS for f in glob.glob(os.path.join(directory, ext)))
+
+    def isOpened(self):
+        return len(self.files) > 0
+
+    def _read_frame(self):
+        if self.index >= len(self.files):
+            return False, None
+        frame = cv2.imread(self.files[self.index])
+        return frame is not None, frame
+
+    def release(self):
+        pass
+
+
+def open_source(spec, realtime=True, fps=None):
+    """
+    Abre una fuente de frames a partir de un índice de cámara, un vídeo o un directorio.
+
+    Todas comparten la interfaz de cv2.VideoCapture (read, isOpened, release)
+    más `last_timestamp`, la marca de tiempo del último frame leído.
+    """
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        return CameraSource(int(spec))
+    if os.path.isdir(spec):
+        return ImageSequenceSource(spec, realtime=realtime, fps=fps or 30.0)
+    return VideoFileSource(spec, realtime=realtime, fps=fps)
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import cv2
+import numpy as np
+
+# Archivo generado por calibrate.py
+CALIBRATION_FILE = "calibration_data.npz"
+
+
+class LensCorrector:
+    """
+    Corrección de distorsión con tablas de remapeo precalculadas.
+
+    cv2.undistort recalcula el modelo de distorsión de cada píxel en cada frame.
+    Aquí se construyen una sola vez por (calibración, resolución) los mapas en
+    punto fijo (CV_16SC2) de initUndistortRectifyMap y cada frame solo hace un
+    cv2.remap. El recorte de la ROI válida va incluido en el propio mapa
+    (desplazando el punto principal), así que remap ya devuelve la imagen
+    recortada sin slice ni copia adicional. Del mismo modo, el espejo
+    horizontal del juego se integra invirtiendo las columnas de los mapas
+    (mirror=True), sin un cv2.flip posterior.
+    Los mapas se guardan en disco junto al archivo de calibración.
+    """
+
+    def __init__(self, calibration_file=CALIBRATION_FILE, use_disk_cache=True):
+        self.calibration_file = calibration_file
+        self.use_disk_cache = use_disk_cache
+        self.camera_matrix = None
+        self.dist_coeffs = None
+        self._key = None
+        self._maps = {}
+
+        if os.path.exists(calibration_file):
+            try:
+                with np.load(calibration_file) as data:
+                    self.camera_matrix = data['mtx']
+                    self.dist_coeffs = data['dist']
+                self._key = hashlib.sha1(
+                    self.camera_matrix.astype(np.float64).tobytes() +
+                    self.dist_coeffs.astype(np.float64).tobytes()).hexdigest()
+                print("Datos de calibración cargados correctamente.")
+            except Exception as e:
+                print(f"Error al cargar datos de calibración: {e}")
+                self.camera_matrix = None
+                self.dist_coeffs = None
+        else:
+            print("No se encontró archivo de calibración, se usará la cámara sin corregir.")
+
+    @property
+    def enabled(self):
+        return self.camera_matrix is not None and self.dist_coeffs is not None
+
+    def _cache_path(self, width, height):
+        base, _ = os.path.splitext(self.calibration_file)
+        return f"{base}_undistort_{width}x{height}.npz"
+
+    def _build_maps(self, width, height):
+        new_camera_matrix, roi = cv2.getOptimalNewCameraMatrix(
+            self.camera_matrix, self.dist_coeffs, (width, height), 1, (width, height))
+        x, y, w, h = roi
+        if w == 0 or h == 0:
+            # ROI degenerada: sin recorte
+            x, y, w, h = 0, 0, width, height
+
+        # Recorte integrado en el mapa: el píxel (0, 0) de la salida es (x, y) de la imagen corregida
+        cropped_matrix = new_camera_matrix.copy()
+        cropped_matrix[0, 2] -= x
+        cropped_matrix[1, 2] -= y
+
+        map1, map2 = cv2.initUndistortRectifyMap(
+            self.camera_matrix, self.dist_coeffs, None, cropped_matrix, (w, h), cv2.CV_16SC2)
+        return map1, map2, (x, y, w, h)
+
+    def _load_cached(self, path):
+        try:
+            with np.load(path) as data:
+                if str(data['key']) != self._key:
+                    return None
+                return data['map1'], data['map2'], tuple(int(v) for v in data['roi'])
+        except Exception:
+            return None
+
+    def maps_for(self, width, height, mirror=False):
+        """
+        Devuelve (map1, map2, roi) para una resolución, construyéndolos si hace falta.
+        Con mirror=True los mapas producen directamente la imagen espejada.
+        """
+        maps = self._maps.get((width, height, mirror))
+        if maps is not None:
+            return maps
+
+        if mirror:
+            # La columna j de la salida espejada es la columna (w - 1 - j) de la normal
+            map1, map2, roi = self.maps_for(width, height)
+            maps = (np.ascontiguousarray(map1[:, ::-1]), np.ascontiguousarray(map2[:, ::-1]), roi)
+            self._maps[(width, height, mirror)] = maps
+            return maps
+
+        path = self._cache_path(width, height)
+        if self.use_disk_cache and os.path.exists(path):
+            maps = self._load_cached(path)
+
+        if maps is None:
+            maps = self._build_maps(width, height)
+            if self.use_disk_cache:
+                try:
+                    np.savez(path, map1=maps[0], map2=maps[1], roi=np.array(maps[2]), key=self._key)
+                except OSError as e:
+                    print(f"No se pudieron guardar los mapas de corrección: {e}")
+
+        self._maps[(width, height, mirror)] = maps
+        return maps
+
+    def output_size(self, width, height):
+        """Tamaño (ancho, alto) de la imagen corregida y recortada."""
+        if not self.enabled:
+            return width, height
+        _, _, (_, _, w, h) = self.maps_for(width, height)
+        return w, h
+
+    def apply(self, frame, mirror=False, dst=None):
+        """
+        Corrige la distorsión y recorta la ROI válida en una sola pasada (y
+        espeja con mirror=True). Con `dst` (del tamaño de output_size) el
+        resultado se escribe en ese buffer en lugar de reservar uno nuevo.
+        """
+        if not self.enabled:
+            if mirror:
+                return cv2.flip(frame, 1, dst=dst)
+            return frame
+        h, w = frame.shape[:2]
+        map1, map2, _ = self.maps_for(w, h, mirror)
+        return cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, dst=dst)
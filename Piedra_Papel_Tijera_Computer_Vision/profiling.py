@@ -0,0 +1,154 @@
+import collections
+import csv
+import functools
+import json
+import time
+import cv2
+import numpy as np
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start, self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """
+    Tiempos por etapa del pipeline (undistort, detect_gesture, drawing...).
+
+    Se usa como `with profiler.span("hsv"): ...` o con el decorador @profiled.
+    Desactivado devuelve siempre el mismo contexto vacío, así que el coste en el
+    bucle del juego es una comprobación de atributo por llamada.
+
+    Activado guarda, por etapa, las últimas `window` duraciones (percentiles
+    móviles para el HUD); con keep_all=True todas (benchmark) y con trace=True
+    una traza exportable a CSV o JSON.
+    """
+
+    def __init__(self, enabled=False, window=300, keep_all=False, trace=False, trace_size=200000):
+        self.enabled = enabled
+        self.window = window
+        self.keep_all = keep_all
+        self.trace = trace
+        self.samples = collections.defaultdict(list)  # etapa -> duraciones en segundos (keep_all)
+        self.recent = collections.defaultdict(lambda: collections.deque(maxlen=self.window))
+        self.events = collections.deque(maxlen=trace_size)  # (etapa, inicio, duración)
+        self._t0 = time.perf_counter()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, seconds, start=None):
+        self.recent[name].append(seconds)
+        if self.keep_all:
+            self.samples[name].append(seconds)
+        if self.trace:
+            self.events.append((name, (start if start is not None else time.perf_counter() - seconds) - self._t0, seconds))
+
+    def reset(self):
+        self.samples.clear()
+        self.recent.clear()
+        self.events.clear()
+
+    def summary(self):
+        """Media y percentiles móviles (ms) de cada etapa."""
+        result = {}
+        for name, values in list(self.recent.items()):
+            if not values:
+                continue
+            ms = np.fromiter(values, dtype=np.float64) * 1000
+            p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+            result[name] = {'count': int(ms.size), 'mean': float(ms.mean()),
+                            'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+        return result
+
+    def export(self, path):
+        """Guarda la traza en CSV (etapa, inicio_ms, duracion_ms) o en JSON (formato chrome://tracing)."""
+        events = list(self.events)
+        if path.lower().endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['stage', 'start_ms', 'duration_ms'])
+                for name, start, dur in events:
+                    writer.writerow([name, f"{start * 1000:.4f}", f"{dur * 1000:.4f}"])
+        else:
+            trace = [{'name': name, 'ph': 'X', 'pid': 0, 'tid': 0,
+                      'ts': start * 1e6, 'dur': dur * 1e6} for name, start, dur in events]
+            with open(path, 'w') as f:
+                json.dump({'traceEvents': trace, 'summary': self.summary()}, f)
+        print(f"Traza de rendimiento guardada en {path} ({len(events)} eventos)")
+
+
+# Perfilador global usado por vision.py, ui.py y engine.py (desactivado por defecto)
+profiler = Profiler()
+
+
+def profiled(name):
+    """Decorador: mide cada llamada a la función como la etapa `name`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return fn(*args, **kwargs)
+            with _Span(profiler, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class PerformanceHUD:
+    """Tabla p50/p95/p99 por etapa dibujada sobre el frame (se recalcula cada `refresh` segundos)."""
+
+    def __init__(self, stages=None, refresh=0.5):
+        self.stages = stages
+        self.refresh = refresh
+        self._lines = []
+        self._last = -float('inf')
+
+    def draw(self, img, origin=(10, 30)):
+        now = time.monotonic()
+        if now - self._last >= self.refresh:
+            self._last = now
+            summary = profiler.summary()
+            names = self.stages if self.stages is not None else sorted(summary)
+            self._lines = ["etapa            p50    p95    p99 ms"]
+            for name in names:
+                if name in summary:
+                    st = summary[name]
+                    self._lines.append(f"{name[:15]:<15}{st['p50']:>6.2f} {st['p95']:>6.2f} {st['p99']:>6.2f}")
+
+        if not self._lines:
+            return
+        x, y = origin
+        line_height = 18
+        width = 330
+        height = line_height * len(self._lines) + 10
+        cv2.rectangle(img, (x - 5, y - 18), (x + width, y - 18 + height), (0, 0, 0), -1)
+        for i, line in enumerate(self._lines):
+            cv2.putText(img, line, (x, y + i * line_height), cv2.FONT_HERSHEY_PLAIN, 1.0, (0, 255, 0), 1)
@@ -0,0 +1,58 @@
+import collections
+import math
+
+# Gesto que devuelve classify_gesture cuando no hay mano válida
+NO_GESTURE = "..."
+
+
+class GestureVoter:
+    """
+    Ventana deslizante de clasificaciones por frame para un jugador.
+
+    Guarda (timestamp, gesto, confianza) de la detección en tiempo real que ya
+    se hace en cada frame, así que decidir el gesto final no cuesta ninguna
+    inferencia extra: basta con votar entre los N frames más cercanos al
+    instante de captura, ponderando por confianza y por distancia temporal.
+    """
+
+    def __init__(self, maxlen=64, sigma=0.15):
+        self.sigma = sigma  # Segundos: anchura de la ponderación temporal
+        self._entries = collections.deque(maxlen=maxlen)
+
+    def add(self, timestamp, gesture, confidence=1.0):
+        if timestamp is None:
+            return
+        # Un mismo frame puede mostrarse varias veces si la cámara va más lenta que el bucle
+        if self._entries and self._entries[-1][0] == timestamp:
+            return
+        self._entries.append((timestamp, gesture, confidence))
+
+    def clear(self):
+        self._entries.clear()
+
+    def count_after(self, timestamp):
+        return sum(1 for t, _, _ in self._entries if t >= timestamp)
+
+    def vote(self, center, n=7):
+        """
+        Devuelve (gesto, puntuación) ganador entre los `n` frames más cercanos a `center`.
+
+        Los frames sin gesto ("...") no votan. Si ninguno de los `n` tiene un gesto
+        válido devuelve (NO_GESTURE, 0.0), y (None, 0.0) si la ventana está vacía.
+        """
+        if not self._entries:
+            return None, 0.0
+
+        nearest = sorted(self._entries, key=lambda e: (abs(e[0] - center), e[0]))[:n]
+        scores = collections.defaultdict(float)
+        for t, gesture, confidence in nearest:
+            if gesture == NO_GESTURE:
+                continue
+            weight = math.exp(-0.5 * ((t - center) / self.sigma) ** 2)
+            scores[gesture] += confidence * weight
+
+        if not scores:
+            return NO_GESTURE, 0.0
+        # Desempate determinista por nombre
+        gesture = max(sorted(scores), key=lambda g: scores[g])
+        return gesture, scores[gesture] / sum(scores.values())
@@ -0,0 +1,337 @@
+import collections
+import functools
+import cv2
+import numpy as np
+
+from profiling import profiled
+
+# Colores BGR
+COLORS_BGR = {
+    "Rojo": (45, 55, 255),
+    "Azul": (255, 140, 50),
+    "Amarillo": (0, 215, 255)
+}
+
+# Colores UI
+UI_BACKGROUND = (40, 40, 40)
+UI_PRIMARY = (255, 140, 50)
+UI_SECONDARY = (100, 200, 100)
+UI_ACCENT = (0, 215, 255)
+UI_SUCCESS = (100, 200, 100)
+UI_WARNING = (0, 165, 255)
+UI_DANGER = (80, 80, 255)
+UI_TEXT_PRIMARY = (255, 255, 255)
+UI_TEXT_SECONDARY = (200, 200, 200)
+UI_PLAYER1 = (255, 140, 50)
+UI_PLAYER2 = (100, 100, 255)
+
+# Composición de elementos semitransparentes
+
+class OverlayCompositor:
+    """
+    Mezcla de elementos semitransparentes limitada a su rectángulo.
+
+    En lugar de copiar el frame entero y mezclarlo entero con addWeighted, el
+    elemento se dibuja sobre un lienzo auxiliar (reutilizado entre frames) en
+    el que solo se ha copiado su rectángulo, y solo ese rectángulo se mezcla.
+    Fuera de él la mezcla completa dejaba los píxeles igual, así que el
+    resultado es idéntico. Los elementos se mezclan en el orden de dibujo,
+    porque el texto opaco de uno puede quedar debajo del fondo del siguiente.
+    """
+
+    def __init__(self):
+        self._canvas = None
+
+    def canvas_for(self, img):
+        if self._canvas is None or self._canvas.shape != img.shape or self._canvas.dtype != img.dtype:
+            self._canvas = np.empty_like(img)
+        return self._canvas
+
+    def blend(self, img, rect, draw, alpha, beta=None):
+        """
+        Dibuja con draw(lienzo) y mezcla el rectángulo `rect` (x1, y1, x2, y2, inclusivo).
+
+        `draw` recibe un lienzo del tamaño de `img` y debe dibujar dentro de
+        `rect` con las mismas coordenadas que usaría sobre `img`.
+        """
+        height, width = img.shape[:2]
+        x1, y1 = max(rect[0], 0), max(rect[1], 0)
+        x2, y2 = min(rect[2] + 1, width), min(rect[3] + 1, height)
+        if x2 <= x1 or y2 <= y1:
+            return
+        canvas = self.canvas_for(img)
+        region = img[y1:y2, x1:x2]
+        canvas[y1:y2, x1:x2] = region
+        draw(canvas)
+        cv2.addWeighted(canvas[y1:y2, x1:x2], alpha, region, 1 - alpha if beta is None else beta, 0, dst=region)
+
+
+# Compositor compartido por todas las funciones de dibujo (solo se dibuja desde el hilo principal)
+compositor = OverlayCompositor()
+
+
+def _merge_boxes(boxes):
+    """Une los rectángulos (x0, y0, x1, y1) que se solapan hasta que no quede ninguno."""
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+class LayerCache:
+    """
+    Capas fijas de la interfaz pre-renderizadas una vez por (pantalla, resolución).
+
+    La función de dibujo se ejecuta sobre un lienzo negro y otro blanco. Sobre
+    negro queda el sprite premultiplicado (color * alpha) y la diferencia entre
+    ambos es la transparencia de cada píxel: 0 en texto y líneas, parcial en los
+    fondos semitransparentes. Cada frame se compone sin rasterizar nada:
+    los píxeles opacos se copian con máscara y las zonas semitransparentes se
+    mezclan con una multiplicación y una suma, solo dentro de sus rectángulos.
+    Las capas se regeneran al cambiar la resolución; invalidate() las descarta
+    todas (p. ej. si cambian los colores de la interfaz).
+    """
+
+    def __init__(self):
+        self._layers = {}
+
+    def invalidate(self):
+        self._layers.clear()
+
+    def _layer(self, key, shape, render):
+        cache_key = (key, shape)
+        layer = self._layers.get(cache_key)
+        if layer is None:
+            layer = self._layers[cache_key] = self._build(shape, render)
+        return layer
+
+    @staticmethod
+    def _build(shape, render):
+        premultiplied = np.zeros(shape, np.uint8)
+        on_white = np.full(shape, 255, np.uint8)
+        render(premultiplied)
+        render(on_white)
+
+        # Sobre negro queda alpha*color; sobre blanco, alpha*color + (1-alpha)*255
+        transparency = cv2.subtract(on_white, premultiplied)
+        max_transparency = transparency.max(axis=2)
+        opaque = (max_transparency == 0).astype(np.uint8)
+        translucent = ((max_transparency > 0) & (transparency.min(axis=2) < 255)).astype(np.uint8)
+
+        # Píxeles opacos: una copia con máscara por franja de filas consecutivas
+        copies = []
+        rows = np.flatnonzero(opaque.any(axis=1))
+        if rows.size:
+            breaks = np.flatnonzero(np.diff(rows) > 1)
+            for y0, y1 in zip(np.r_[rows[0], rows[breaks + 1]], np.r_[rows[breaks], rows[-1]] + 1):
+                cols = np.flatnonzero(opaque[y0:y1].any(axis=0))
+                x0, x1 = cols[0], cols[-1] + 1
+                copies.append((y0, y1, x0, x1, premultiplied[y0:y1, x0:x1].copy(), opaque[y0:y1, x0:x1].copy()))
+
+        # Zonas semitransparentes: frame * transparencia / 255 + sprite, por rectángulo.
+        # El texto parte los fondos en varios trozos; sus rectángulos se unen si se
+        # solapan, para no mezclar dos veces el mismo píxel.
+        count, _, stats, _ = cv2.connectedComponentsWithStats(translucent)
+        boxes = _merge_boxes([[x0, y0, x0 + w, y0 + h] for x0, y0, w, h, _ in stats[1:count]])
+        blends = [(y0, y1, x0, x1, premultiplied[y0:y1, x0:x1].copy(), transparency[y0:y1, x0:x1].copy())
+                  for x0, y0, x1, y1 in boxes]
+        return {'copies': copies, 'blends': blends}
+
+    @profiled("draw_static_layer")
+    def draw(self, img, key, render):
+        """Compone sobre `img` la capa `key`, generándola con render(lienzo) si no existe."""
+        layer = self._layer(key, img.shape, render)
+        for y0, y1, x0, x1, sprite, transparency in layer['blends']:
+            region = img[y0:y1, x0:x1]
+            # En el sitio: operaciones por píxel, sin temporal para el producto
+            cv2.multiply(region, transparency, dst=region, scale=1 / 255)
+            cv2.add(region, sprite, dst=region)
+        for y0, y1, x0, x1, sprite, mask in layer['copies']:
+            region = img[y0:y1, x0:x1]
+            cv2.copyTo(sprite, mask, region)
+
+
+# Capas fijas de las pantallas del juego
+static_layers = LayerCache()
+
+# Texto: medidas y textos rasterizados en caché
+
+TEXT_CACHE_SIZE = 256 # Textos distintos que se guardan (los menos usados se descartan)
+
+@functools.lru_cache(maxsize=TEXT_CACHE_SIZE)
+def text_size(text, font, font_scale, thickness):
+    """cv2.getTextSize con caché: ((ancho, alto), baseline)."""
+    return cv2.getTextSize(text, font, font_scale, thickness)
+
+
+class TextCache:
+    """
+    LRU de textos ya rasterizados (con su contorno) para pegarlos sin putText.
+
+    Cada entrada es un sprite BGR recortado al texto con su máscara y su
+    desplazamiento respecto al origen de putText. putText (LINE_8) dibuja igual
+    en cualquier origen entero, así que pegar el sprite da los mismos píxeles
+    que dibujar el texto otra vez.
+    """
+
+    def __init__(self, maxsize=TEXT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._sprites = collections.OrderedDict()
+
+    def clear(self):
+        self._sprites.clear()
+
+    def sprite(self, text, font, font_scale, text_color, thickness, outline_color=None, outline_thickness=0):
+        """(dx, dy, sprite, máscara) del texto; (dx, dy) es la esquina respecto al origen."""
+        key = (text, font, font_scale, tuple(text_color), thickness,
+               None if outline_color is None else tuple(outline_color), outline_thickness)
+        entry = self._sprites.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._sprites.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        entry = self._render(text, font, font_scale, text_color, thickness, outline_color, outline_thickness)
+        self._sprites[key] = entry
+        if len(self._sprites) > self.maxsize:
+            self._sprites.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _render(text, font, font_scale, text_color, thickness, outline_color, outline_thickness):
+        (width, height), baseline = text_size(text, font, font_scale, max(thickness, outline_thickness))
+        # Margen amplio: los trazos gruesos sobresalen de lo que mide getTextSize
+        pad = 2 * max(thickness, outline_thickness) + int(10 * font_scale) + 4
+        origin = (pad, pad + height)
+        shape = (height + baseline + 2 * pad, width + 2 * pad)
+        canvas = np.zeros(shape + (3,), np.uint8)
+        mask = np.zeros(shape, np.uint8)
+        if outline_color is not None:
+            cv2.putText(canvas, text, origin, font, font_scale, outline_color, outline_thickness)
+            cv2.putText(mask, text, origin, font, font_scale, 255, outline_thickness)
+        cv2.putText(canvas, text, origin, font, font_scale, text_color, thickness)
+        cv2.putText(mask, text, origin, font, font_scale, 255, thickness)
+
+        x, y, w, h = cv2.boundingRect(mask)
+        return (x - origin[0], y - origin[1],
+                canvas[y:y + h, x:x + w].copy(), mask[y:y + h, x:x + w].copy())
+
+    def draw(self, img, text, position, font, font_scale, text_color, thickness,
+             outline_color=None, outline_thickness=0):
+        """Pega el texto en `position` (origen de putText), recortado a los bordes de `img`."""
+        dx, dy, sprite, mask = self.sprite(text, font, font_scale, text_color, thickness,
+                                           outline_color, outline_thickness)
+        x0, y0 = position[0] + dx, position[1] + dy
+        height, width = img.shape[:2]
+        sx0, sy0 = max(-x0, 0), max(-y0, 0)
+        sx1 = min(sprite.shape[1], width - x0)
+        sy1 = min(sprite.shape[0], height - y0)
+        if sx1 <= sx0 or sy1 <= sy0:
+            return
+        region = img[y0 + sy0:y0 + sy1, x0 + sx0:x0 + sx1]
+        cv2.copyTo(sprite[sy0:sy1, sx0:sx1], mask[sy0:sy1, sx0:sx1], region)
+
+
+# Caché de textos compartida por las funciones de dibujo
+text_cache = TextCache()
+
+# Funciones de Dibujo
+
+@profiled("draw_rounded_rectangle")
+def draw_rounded_rectangle(img, pt1, pt2, color, thickness=2, radius=20, fill=False):
+    """Dibuja un rectángulo con esquinas redondeadas."""
+    x1, y1 = pt1
+    x2, y2 = pt2
+    
+    # Asegurar que radius no sea mayor que la mitad del ancho/alto
+    radius = min(radius, abs(x2-x1)//2, abs(y2-y1)//2)
+    
+    if fill:
+        # Modo relleno: dibujar rectángulos y círculos rellenos
+        # Rectángulo central horizontal
+        cv2.rectangle(img, (x1 + radius, y1), (x2 - radius, y2), color, -1)
+        # Rectángulos laterales
+        cv2.rectangle(img, (x1, y1 + radius), (x1 + radius, y2 - radius), color, -1)
+        cv2.rectangle(img, (x2 - radius, y1 + radius), (x2, y2 - radius), color, -1)
+        # Círculos en las esquinas (rellenos)
+        cv2.circle(img, (x1 + radius, y1 + radius), radius, color, -1)
+        cv2.circle(img, (x2 - radius, y1 + radius), radius, color, -1)
+        cv2.circle(img, (x1 + radius, y2 - radius), radius, color, -1)
+        cv2.circle(img, (x2 - radius, y2 - radius), radius, color, -1)
+    else:
+        # Modo contorno: dibujar líneas y arcos
+        # Líneas rectas
+        cv2.line(img, (x1 + radius, y1), (x2 - radius, y1), color, thickness)
+        cv2.line(img, (x1 + radius, y2), (x2 - radius, y2), color, thickness)
+        cv2.line(img, (x1, y1 + radius), (x1, y2 - radius), color, thickness)
+        cv2.line(img, (x2, y1 + radius), (x2, y2 - radius), color, thickness)
+        
+        # Esquinas redondeadas (arcos)
+        cv2.ellipse(img, (x1 + radius, y1 + radius), (radius, radius), 180, 0, 90, color, thickness)
+        cv2.ellipse(img, (x2 - radius, y1 + radius), (radius, radius), 270, 0, 90, color, thickness)
+        cv2.ellipse(img, (x1 + radius, y2 - radius), (radius, radius), 90, 0, 90, color, thickness)
+        cv2.ellipse(img, (x2 - radius, y2 - radius), (radius, radius), 0, 0, 90, color, thickness)
+
+
+@profiled("draw_text_with_background")
+def draw_text_with_background(img, text, position, font=cv2.FONT_HERSHEY_SIMPLEX, 
+                               font_scale=1, text_color=(255,255,255), 
+                               bg_color=(0,0,0), thickness=2, padding=10, alpha=0.7):
+    """Dibuja texto con fondo semitransparente."""
+    # Obtener tamaño del texto
+    (text_width, text_height), baseline = text_size(text, font, font_scale, thickness)
+    
+    x, y = position
+    
+    # Rectángulo de fondo con transparencia (solo se mezcla su zona)
+    pt1 = (x - padding, y - text_height - padding)
+    pt2 = (x + text_width + padding, y + baseline + padding)
+    compositor.blend(img, pt1 + pt2, lambda canvas: cv2.rectangle(canvas, pt1, pt2, bg_color, -1), alpha)
+    
+    # Dibujar texto
+    text_cache.draw(img, text, (x, y), font, font_scale, text_color, thickness)
+    
+    return text_width, text_height
+
+@profiled("draw_translucent_panel")
+def draw_translucent_panel(img, pt1, pt2, color, alpha, radius=30, beta=None):
+    """Panel relleno con esquinas redondeadas y semitransparente."""
+    compositor.blend(img, pt1 + pt2,
+                     lambda canvas: draw_rounded_rectangle(canvas, pt1, pt2, color, thickness=-1, radius=radius, fill=True),
+                     alpha, beta)
+
+@profiled("draw_text_with_outline")
+def draw_text_with_outline(img, text, position, font=cv2.FONT_HERSHEY_SIMPLEX,
+                           font_scale=1, text_color=(255,255,255), 
+                           outline_color=(0,0,0), thickness=2, outline_thickness=None):
+    """Dibuja texto con contorno para mejor legibilidad."""
+    if outline_thickness is None:
+        outline_thickness = thickness + 2
+    
+    # Contorno y texto, rasterizados una vez y pegados desde la caché
+    text_cache.draw(img, text, position, font, font_scale, text_color, thickness,
+                    outline_color, outline_thickness)
+
+@profiled("draw_progress_circle")
+def draw_progress_circle(img, center, radius, progress, color, thickness=8):
+    """Dibuja un círculo de progreso (0.0 a 1.0)."""
+    # Círculo de fondo (gris)
+    cv2.circle(img, center, radius, (80, 80, 80), thickness)
+    
+    # Arco de progreso
+    if progress > 0:
+        angle = int(360 * progress)
+        cv2.ellipse(img, center, (radius, radius), -90, 0, angle, color, thickness)
@@ -0,0 +1,388 @@
+import cv2
+import numpy as np
+import math
+import time
+
+from color_profile import ColorProfile
+from frame_pipeline import ScratchBuffers
+from profiling import profiler, profiled
+
+# Perfil de color (piel + chroma key), cargado una vez y recargado si cambia el archivo
+color_profile = ColorProfile("color_config.npy")
+
+# Configuración HSV
+LOWER_RED1 = np.array([0, 120, 70])
+UPPER_RED1 = np.array([10, 255, 255])
+LOWER_RED2 = np.array([170, 120, 70])
+UPPER_RED2 = np.array([180, 255, 255])
+
+LOWER_BLUE = np.array([94, 80, 2])
+UPPER_BLUE = np.array([126, 255, 255])
+
+LOWER_YELLOW = np.array([20, 100, 100])
+UPPER_YELLOW = np.array([35, 255, 255])
+
+# Funciones de Visión
+
+# Umbrales de los defectos de convexidad (fracciones de la altura de la ROI)
+DEFECT_DEPTH_RATIO = 0.15 # Profundidad mínima del hueco entre dedos
+DEFECT_WRIST_RATIO = 0.9 # Los defectos por debajo de esta altura son la muñeca
+DEFECT_MAX_ANGLE = 90 # Ángulo máximo (grados) entre dos dedos
+
+def analyze_defects(contour, defects, roi_height):
+    """
+    Análisis vectorizado de los defectos de convexidad de la mano.
+
+    Calcula de una vez ángulo, profundidad y filtro de muñeca de todos los
+    defectos. Devuelve un diccionario con el número de dedos separados
+    ('count'), los defectos dudosos ('ambiguous') y los arrays por defecto
+    'start', 'end', 'far' (N x 2), 'depth', 'angle', 'finger' e 'ignored'.
+    """
+    if defects is None or len(defects) == 0:
+        empty = np.empty((0, 2), np.int32)
+        return {'count': 0, 'ambiguous': 0, 'start': empty, 'end': empty, 'far': empty,
+                'depth': np.empty(0), 'angle': np.empty(0),
+                'finger': np.empty(0, bool), 'ignored': np.empty(0, bool)}
+
+    points = contour.reshape(-1, 2)
+    indices = defects.reshape(-1, 4)
+    start = points[indices[:, 0]]
+    end = points[indices[:, 1]]
+    far = points[indices[:, 2]]
+    depth = indices[:, 3] / 256.0
+
+    # Ley del coseno en el triángulo (start, end, far): ángulo en `far`
+    length_a = np.hypot(*(end - far).T.astype(np.float64))
+    length_b = np.hypot(*(start - far).T.astype(np.float64))
+    length_c = np.hypot(*(end - start).T.astype(np.float64))
+    denom = 2 * length_a * length_b
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_angle = np.clip((length_a ** 2 + length_b ** 2 - length_c ** 2) / denom, -1, 1)
+    angle = np.where(denom == 0, 0.0, np.degrees(np.arccos(cos_angle)))
+
+    # Filtros: Ignorar muñeca (parte baja) y ángulos abiertos
+    h = roi_height
+    ignored = far[:, 1] > h * DEFECT_WRIST_RATIO
+    min_depth = h * DEFECT_DEPTH_RATIO
+    finger = ~ignored & (depth > min_depth) & (angle <= DEFECT_MAX_ANGLE)
+    ambiguous = ~ignored & (((np.abs(depth - min_depth) < h * 0.03) & (angle <= DEFECT_MAX_ANGLE)) |
+                            ((depth > min_depth) & (np.abs(angle - DEFECT_MAX_ANGLE) < 10)))
+
+    return {'count': int(finger.sum()), 'ambiguous': int(ambiguous.sum()),
+            'start': start, 'end': end, 'far': far, 'depth': depth, 'angle': angle,
+            'finger': finger, 'ignored': ignored}
+
+def draw_defects(roi, analysis):
+    """Visualización opcional: punto rojo en cada hueco entre dedos."""
+    for far in analysis['far'][analysis['finger']]:
+        cv2.circle(roi, (int(far[0]), int(far[1])), 6, (0, 0, 255), -1)
+
+def _lap(timings, name, start):
+    """Cierra la etapa `name` iniciada en `start`: la guarda en `timings` y en el perfilador."""
+    end = time.perf_counter()
+    timings[name] = end - start
+    if profiler.enabled:
+        profiler.record(name, end - start, start)
+    return end
+
+def _gesture_result(gesture, confidence, timings, contour=None, hull=None, defects=None, area=0.0):
+    return {'gesture': gesture, 'confidence': confidence, 'contour': contour, 'hull': hull,
+            'defects': defects, 'area': area, 'timings': timings}
+
+# Segmentación de la mano en classify_gesture:
+#   "box": caja inRange de piel del perfil, con la limpieza morfológica completa.
+#   "backproject": tabla de probabilidad H-S del perfil (calcBackProject), ya
+#   binarizada y sin el fondo; su máscara tiene menos ruido y basta una
+#   apertura y una dilatación.
+SKIN_BACKENDS = ("box", "backproject")
+SKIN_KERNEL = np.ones((5, 5), np.uint8)
+BACKPROJECT_OPEN_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+HS_RANGES = [0, 180, 0, 256]
+
+def segment_skin(hsv, backend="box", timings=None, foreground=None, scratch=None):
+    """
+    Máscara binaria de la mano (piel y no fondo), ya limpia para findContours.
+
+    `foreground` es la máscara de primer plano de un modelo de fondo
+    (background_model.py); si se da, sustituye al chroma key. Las máscaras se
+    escriben en los buffers de `scratch` (frame_pipeline.ScratchBuffers); la
+    devuelta es uno de ellos. Guarda en `timings` (y en el perfilador) las
+    etapas "masks" y "morphology".
+    """
+    timings = {} if timings is None else timings
+    scratch = ScratchBuffers() if scratch is None else scratch
+    shape = hsv.shape[:2]
+    fg_mask = scratch.get("fg_mask", shape)
+    work = scratch.get("work_mask", shape)
+    t = time.perf_counter()
+
+    # Umbrales del perfil de color (recarga en caliente si color_tuner.py lo
+    # modifica); se toman una vez para que todas las máscaras usen el mismo juego
+    color_profile.refresh()
+    profile = color_profile.current()
+
+    if foreground is not None:
+        # Modelo de fondo en lugar del chroma key
+        if backend == "backproject":
+            cv2.calcBackProject([hsv], [0, 1], profile['skin_table'], HS_RANGES, 1, dst=work)
+        else:
+            cv2.inRange(hsv, profile['skin_lower'], profile['skin_upper'], dst=work)
+        cv2.bitwise_and(work, foreground, dst=fg_mask)
+    elif backend == "backproject":
+        # La tabla ya lleva el umbral de probabilidad y el chroma key
+        cv2.calcBackProject([hsv], [0, 1], profile['skin_table'], HS_RANGES, 1, dst=fg_mask)
+    else:
+        # 1. Máscara Fondo (Chroma)
+        cv2.inRange(hsv, profile['bg_lower'], profile['bg_upper'], dst=work)
+
+        # 2. Máscara Piel
+        cv2.inRange(hsv, profile['skin_lower'], profile['skin_upper'], dst=fg_mask)
+
+        # 3. Combinación: con máscaras 0/255 la resta saturada es piel AND NOT fondo
+        cv2.subtract(fg_mask, work, dst=fg_mask)
+    t = _lap(timings, "masks", t)
+
+    # 4. Procesamiento morfológico (alternando entre los dos buffers)
+    if backend == "backproject":
+        cv2.morphologyEx(fg_mask, cv2.MORPH_OPEN, BACKPROJECT_OPEN_KERNEL, dst=work)
+        thresh = cv2.dilate(work, SKIN_KERNEL, dst=fg_mask, iterations=1)
+    else:
+        cv2.erode(fg_mask, SKIN_KERNEL, dst=work, iterations=1)
+        cv2.dilate(work, SKIN_KERNEL, dst=fg_mask, iterations=2)
+        cv2.GaussianBlur(fg_mask, (5, 5), 0, dst=work)
+        thresh = cv2.threshold(work, 127, 255, cv2.THRESH_BINARY, dst=fg_mask)[1]
+    _lap(timings, "morphology", t)
+    return thresh
+
+@profiled("detect_gesture")
+def classify_gesture(roi, skin_backend="box", foreground=None, scratch=None):
+    """
+    Clasifica el gesto de una Región de Interés (ROI) sin modificar sus píxeles.
+
+    Devuelve un diccionario con 'gesture' (Piedra, Papel, Tijera o "..."),
+    'confidence' (0..1), 'contour' y 'hull' de la mano, 'defects' (resultado de
+    analyze_defects), 'area' y 'timings' (segundos por etapa). La ROI puede ser
+    de solo lectura; el dibujo se hace aparte con draw_gesture_overlay.
+    `skin_backend` elige la segmentación de la mano (ver SKIN_BACKENDS),
+    `foreground`, la máscara de un modelo de fondo que sustituye al chroma key,
+    y `scratch`, los buffers de la ROI donde se escriben la imagen HSV y las
+    máscaras (sin él se reservan en cada llamada).
+
+    La confianza crece con el área de la mano y baja con cada defecto dudoso
+    (cerca del umbral de profundidad o de ángulo), que podría cambiar el conteo.
+    """
+    timings = {}
+    if roi.size == 0: return _gesture_result("...", 0.0, timings)
+    scratch = ScratchBuffers() if scratch is None else scratch
+
+    # Convertir a HSV
+    t = time.perf_counter()
+    hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV, dst=scratch.get("hsv", roi.shape))
+    _lap(timings, "hsv", t)
+
+    thresh = segment_skin(hsv, skin_backend, timings, foreground, scratch)
+    t = time.perf_counter()
+
+    contours, _ = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    t = _lap(timings, "contours", t)
+
+    if len(contours) == 0:
+        return _gesture_result("...", 0.0, timings)
+
+    contour = max(contours, key=cv2.contourArea)
+
+    # Filtro de área mínima para evitar ruido
+    area = cv2.contourArea(contour)
+    if area <= 2000:
+        return _gesture_result("...", 0.0, timings, contour=contour, area=area)
+
+    hull = cv2.convexHull(contour, returnPoints=False)
+    try:
+        defects = cv2.convexityDefects(contour, hull)
+    except cv2.error:
+        _lap(timings, "defects", t)
+        return _gesture_result("...", 0.0, timings, contour=contour, hull=hull, area=area)
+
+    analysis = analyze_defects(contour, defects, roi.shape[0])
+    _lap(timings, "defects", t)
+
+    # Clasificación
+    count_defects = analysis['count']
+    if count_defects == 0: gesture = "Piedra"
+    elif count_defects == 1 or count_defects == 2: gesture = "Tijera"
+    else: gesture = "Papel"
+
+    area_factor = min(1.0, area / 8000)
+    return _gesture_result(gesture, area_factor / (1 + analysis['ambiguous']), timings,
+                           contour=contour, hull=hull, defects=analysis, area=area)
+
+def draw_gesture_overlay(roi, result):
+    """Feedback visual de classify_gesture: huecos entre dedos y contorno de la mano."""
+    if result['defects'] is None:
+        return
+    with profiler.span("gesture_drawing"):
+        draw_defects(roi, result['defects'])
+        cv2.drawContours(roi, [result['contour']], -1, (0, 255, 0), 2)
+
+# Segmentación de las bolas en una sola pasada.
+# Los tres rangos son cajas en HSV, así que "píxel dentro del rango" se separa por
+# canales: una tabla de 256 entradas por canal da un bit por color y el AND de los
+# tres canales deja la etiqueta de cada píxel (0 = ninguno). Equivale exactamente a
+# los inRange de cada color, pero recorre la imagen una sola vez.
+BALL_LABELS = (("Rojo", 1), ("Azul", 2), ("Amarillo", 4))
+BALL_MIN_AREA = 2000 # Filtro de tamaño para la bola
+BALL_MIN_CIRCULARITY = 0.60 # 60% de redondez mínimo
+BALL_KERNEL = np.ones((5, 5), np.uint8)
+BALL_BLUR_SIZE = 11 # Blur previo a la conversión a HSV
+
+# Detección piramidal: candidatos a 1/2**nivel de resolución y confirmación a
+# resolución completa solo alrededor del ganador
+BALL_PYRAMID_KERNEL = np.ones((3, 3), np.uint8)
+BALL_CANDIDATE_AREA_FACTOR = 0.5 # El contorno pixelado mide menos área que el real
+BALL_CANDIDATE_CIRCULARITY = 0.40 # La circularidad exacta se comprueba al refinar
+BALL_REFINE_MARGIN = 32 # px alrededor del candidato (blur + morfología + redondeo de escala)
+
+def _build_ball_luts():
+    """Tablas H, S y V -> bits de color, a partir de los rangos LOWER_*/UPPER_*."""
+    ranges = {1: [(LOWER_RED1, UPPER_RED1), (LOWER_RED2, UPPER_RED2)],
+              2: [(LOWER_BLUE, UPPER_BLUE)],
+              4: [(LOWER_YELLOW, UPPER_YELLOW)]}
+    luts = np.zeros((3, 256), np.uint8)
+    values = np.arange(256)
+    for bit, boxes in ranges.items():
+        # Los dos tramos del rojo comparten S y V, así que basta con unir los de H
+        for channel in range(3):
+            inside = np.zeros(256, bool)
+            for lower, upper in boxes:
+                inside |= (values >= lower[channel]) & (values <= upper[channel])
+            luts[channel][inside] |= bit
+    return luts
+
+BALL_LUT_H, BALL_LUT_S, BALL_LUT_V = _build_ball_luts()
+
+def segment_balls(frame_hsv, scratch=None):
+    """Etiqueta de color de cada píxel (0, 1 = rojo, 2 = azul, 4 = amarillo)."""
+    scratch = ScratchBuffers() if scratch is None else scratch
+    shape = frame_hsv.shape[:2]
+    channel = scratch.get("ball_channel", shape)
+    bits = scratch.get("ball_bits", shape)
+    labels = cv2.LUT(cv2.extractChannel(frame_hsv, 0, dst=channel), BALL_LUT_H, dst=scratch.get("ball_labels", shape))
+    cv2.LUT(cv2.extractChannel(frame_hsv, 1, dst=channel), BALL_LUT_S, dst=bits)
+    cv2.bitwise_and(labels, bits, dst=labels)
+    cv2.LUT(cv2.extractChannel(frame_hsv, 2, dst=channel), BALL_LUT_V, dst=bits)
+    cv2.bitwise_and(labels, bits, dst=labels)
+    return labels
+
+@profiled("detect_color_ball")
+def detect_color_ball(frame_hsv, min_area=BALL_MIN_AREA, min_circularity=BALL_MIN_CIRCULARITY,
+                      kernel=BALL_KERNEL, offset=(0, 0), scratch=None):
+    """
+    Detecta el color de la bola para el selector de modo.
+
+    Los umbrales se pueden ajustar para buscar sobre imágenes reducidas; `offset`
+    se suma a los contornos devueltos (detección sobre un recorte del frame).
+    Las máscaras se escriben en los buffers de `scratch`.
+    """
+    scratch = ScratchBuffers() if scratch is None else scratch
+    with profiler.span("ball_masks"):
+        labels = segment_balls(frame_hsv, scratch)
+        # Los colores no se solapan: cada máscara es una comparación con su etiqueta
+        masks = [cv2.compare(labels, bit, cv2.CMP_EQ, dst=scratch.get(f"ball_mask_{bit}", labels.shape))
+                 for _, bit in BALL_LABELS]
+
+    with profiler.span("ball_morphology"):
+        # Opening (quitamos ruido blanco) y closing (cerramos agujeros dentro de la bola),
+        # solo en el rectángulo que contiene píxeles del color (con margen para los filtros)
+        # Apertura + cierre mueven los bordes como mucho 4 radios del kernel: con ese
+        # margen el recorte da el mismo resultado que filtrar la imagen entera
+        margin = 4 * (kernel.shape[0] // 2)
+        regions = []
+        h, w = labels.shape
+        for mask in masks:
+            x, y, rw, rh = cv2.boundingRect(mask)
+            if rw == 0:
+                regions.append(None)
+                continue
+            x0, y0 = max(x - margin, 0), max(y - margin, 0)
+            x1, y1 = min(x + rw + margin, w), min(y + rh + margin, h)
+            region = mask[y0:y1, x0:x1]
+            cv2.morphologyEx(region, cv2.MORPH_OPEN, kernel, dst=region)
+            cv2.morphologyEx(region, cv2.MORPH_CLOSE, kernel, dst=region)
+            regions.append((region, (x0 + offset[0], y0 + offset[1])))
+
+    max_area = 0
+    detected = None
+    contour_draw = None
+
+    with profiler.span("ball_contours"):
+        # Solo contornos exteriores: los huecos interiores nunca son la bola
+        for region, (label, _) in zip(regions, BALL_LABELS):
+            if region is None: continue
+            contours, _ = cv2.findContours(region[0], cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=region[1])
+            for c in contours:
+                area = cv2.contourArea(c)
+                if area > max_area and area > min_area:
+                    # Comprobación de Circularidad
+                    perimeter = cv2.arcLength(c, True)
+                    if perimeter == 0: continue
+
+                    # Formula circularidad: 4*pi*area / perimetro^2
+                    # Un circulo perfecto es 1.0
+                    circularity = 4 * math.pi * (area / (perimeter * perimeter))
+
+                    if circularity > min_circularity:
+                        max_area = area
+                        detected = label
+                        contour_draw = c
+
+    return detected, contour_draw
+
+def _ball_hsv(frame, blur_size=BALL_BLUR_SIZE, scratch=None):
+    """Blur para reducir ruido y conversión a HSV."""
+    scratch = ScratchBuffers() if scratch is None else scratch
+    with profiler.span("ball_blur"):
+        if blur_size > 1:
+            frame = cv2.GaussianBlur(frame, (blur_size, blur_size), 0, dst=scratch.get("ball_blur", frame.shape))
+    with profiler.span("ball_hsv"):
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=scratch.get("ball_hsv", frame.shape))
+
+@profiled("detect_color_ball_pyramid")
+def detect_color_ball_pyramid(frame, level=2, offset=(0, 0), scratch=None):
+    """
+    detect_color_ball sobre un frame BGR buscando primero a 1/2**level de resolución.
+
+    El área mínima, el blur y el kernel se escalan con el nivel. El candidato
+    ganador se confirma a resolución completa solo dentro de su rectángulo, con
+    los umbrales originales, así que el contorno devuelto está en coordenadas del
+    frame y con la misma precisión. Con level=0 se procesa el frame entero.
+    Si `frame` es un recorte, `offset` es su esquina en el frame original.
+    Las dos pasadas usan los mismos buffers de `scratch` (la reducida termina
+    antes de empezar el refinado).
+    """
+    scratch = ScratchBuffers() if scratch is None else scratch
+    if level <= 0:
+        return detect_color_ball(_ball_hsv(frame, scratch=scratch), offset=offset, scratch=scratch)
+
+    scale = 1.0 / (1 << level)
+    with profiler.span("ball_pyramid"):
+        # Mismo redondeo que resize con fx/fy, para que el buffer tenga su tamaño
+        small_shape = (round(frame.shape[0] * scale), round(frame.shape[1] * scale)) + frame.shape[2:]
+        small = cv2.resize(frame, None, dst=scratch.get("ball_small", small_shape), fx=scale, fy=scale,
+                           interpolation=cv2.INTER_LINEAR)
+    small_hsv = _ball_hsv(small, int(BALL_BLUR_SIZE * scale) | 1, scratch)
+    color, contour = detect_color_ball(small_hsv,
+                                       min_area=BALL_MIN_AREA * scale * scale * BALL_CANDIDATE_AREA_FACTOR,
+                                       min_circularity=BALL_CANDIDATE_CIRCULARITY,
+                                       kernel=BALL_PYRAMID_KERNEL, scratch=scratch)
+    if color is None:
+        return None, None
+
+    # Refinado a resolución completa alrededor del candidato
+    height, width = frame.shape[:2]
+    x, y, w, h = cv2.boundingRect(contour)
+    x0 = max(int(x / scale) - BALL_REFINE_MARGIN, 0)
+    y0 = max(int(y / scale) - BALL_REFINE_MARGIN, 0)
+    x1 = min(int((x + w) / scale) + BALL_REFINE_MARGIN, width)
+    y1 = min(int((y + h) / scale) + BALL_REFINE_MARGIN, height)
+    return detect_color_ball(_ball_hsv(frame[y0:y1, x0:x1], scratch=scratch), offset=(x0 + offset[0], y0 + offset[1]),
+                             scratch=scratch)